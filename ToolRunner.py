@@ -1,10 +1,26 @@
+import datetime
+import os
 from functools import partial
 
 import sublime
 import sublime_plugin
 
-from .lib import debug, manager, settings, util
+from .lib import (
+    choices,
+    debug,
+    executables,
+    history,
+    manager,
+    marks,
+    prewarm,
+    profiling,
+    settings,
+    util,
+    watch,
+)
 from .lib.command import Command
+from .lib.fanout import FanOutCommand
+from .lib.tool import Tool
 
 
 class ToolRunner(sublime_plugin.WindowCommand):
@@ -51,69 +67,53 @@ class ToolRunner(sublime_plugin.WindowCommand):
             )
 
     def _ask_tool_to_run(self, callback):
-        tool_list = []
-        tool_selection_list = []
+        tools = choices.get_tools()
 
-        def_tool_list = settings.get_tools()
-
-        if len(def_tool_list) <= 0:
+        if len(tools) <= 0:
             sublime.error_message("There are no tools configured")
             return
 
-        debug.log("Creating Tools item list for Quick Panel", def_tool_list)
-
-        for single_tool in def_tool_list:
-            debug.log("Appending ", single_tool)
-            tool_name = single_tool.get("name", single_tool.get("cmd"))
-            tool_list.append(tool_name)
-
-            desc = single_tool.get("desc")
-
-            if desc is not None:
-                tool_selection_list.append(desc + " (" + tool_name + ")")
-            else:
-                tool_selection_list.append(tool_name)
+        callback = partial(callback, tools.names)
 
-        callback = partial(callback, tool_list)
-
-        self.window.show_quick_panel(tool_selection_list, callback, 0, 0, None)
+        self.window.show_quick_panel(tools.items, callback, 0, 0, None)
 
     def _on_ask_tool_done(self, command, tool_list, selected_index):
-        tool_selected = tool_list[selected_index]
-
         if selected_index > -1:
+            tool_selected = tool_list[selected_index]
+            choices.mark_used("tool", tool_selected)
             command.run_tool(tool_selected)
 
     def _ask_group_and_profile_to_run(self, callback):
-        group_list = [single_group["name"] for single_group in settings.get_groups()]
+        groups = choices.get_groups()
 
-        if len(group_list) <= 0:
+        if len(groups) <= 0:
             sublime.error_message("There are no groups configured")
         else:
-            callback = partial(callback, group_list)
+            callback = partial(callback, groups.names)
 
-            self.window.show_quick_panel(group_list, callback, 0, 0, None)
+            self.window.show_quick_panel(groups.items, callback, 0, 0, None)
 
     def _on_ask_group_done(self, command, group_list, selected_index):
-        group_selected = group_list[selected_index]
-
         if selected_index >= 0:
+            group_selected = group_list[selected_index]
             callback = partial(self._on_ask_profile_done, command)
             sublime.set_timeout(
                 partial(self._ask_profile_and_run_command, group_selected, callback), 0
             )
 
     def _ask_profile_and_run_command(self, group_selected, callback):
-        profiles = settings.get_profiles(group_selected)
+        profiles = choices.get_profiles(group_selected)
 
         if len(profiles) <= 0:
             sublime.error_message("This group has no profiles configured")
             return
 
-        profile_list = [profile["name"] for profile in profiles]
-
         self.window.show_quick_panel(
-            profile_list, partial(callback, group_selected, profile_list), 0, 0, None
+            profiles.items,
+            partial(callback, group_selected, profiles.names),
+            0,
+            0,
+            None,
         )
 
     def _on_ask_profile_done(
@@ -121,9 +121,38 @@ class ToolRunner(sublime_plugin.WindowCommand):
     ):
         if selected_index >= 0:
             selected_profile = profile_list[selected_index]
+            choices.mark_profile_used(group_selected, selected_profile)
             command.run_profile(group_selected, selected_profile)
 
 
+class ToolRunnerRunAllProfiles(sublime_plugin.WindowCommand):
+    def run(self, group=None, profiles=None, **kwargs):
+        command = FanOutCommand(self.window, kwargs)
+
+        if group is not None:
+            command.run_group(group, profiles)
+            return
+
+        groups = choices.get_groups()
+
+        if len(groups) <= 0:
+            sublime.error_message("There are no groups configured")
+            return
+
+        self.window.show_quick_panel(
+            groups.items,
+            partial(self._on_ask_group_done, command, groups.names, profiles),
+            0,
+            0,
+            None,
+        )
+
+    def _on_ask_group_done(self, command, group_list, profiles, selected_index):
+        if selected_index >= 0:
+            choices.mark_used("group", group_list[selected_index])
+            command.run_group(group_list[selected_index], profiles)
+
+
 class ToolRunnerCancelCurrent(sublime_plugin.WindowCommand):
     def run(self):
         manager.cancel_command_for_view_id(self.window.active_view().id())
@@ -149,23 +178,136 @@ class ToolRunnerFocusSource(sublime_plugin.WindowCommand):
             util.notify("This view is not an output")
 
 
+def _get_output_view(window):
+    view = window.active_view()
+    target_view = manager.get_target_view_for_source_view(view)
+
+    return view if target_view is None else target_view
+
+
+def _show_mark(view, offset):
+    view.sel().clear()
+    view.sel().add(sublime.Region(offset, offset))
+    view.show_at_center(offset)
+    manager.ensure_visible_view(view, focus=True)
+
+
+class ToolRunnerNextMark(sublime_plugin.WindowCommand):
+    def run(self, kind=None, forward=True):
+        view = _get_output_view(self.window)
+        index = marks.get_index(view.id())
+
+        if index is None:
+            util.notify("This output has no marks", target=view)
+            return
+
+        point = view.sel()[0].begin() if len(view.sel()) > 0 else 0
+        offset = index.find(point, forward, kind)
+
+        if offset is None:
+            util.notify("There are no more marks", target=view)
+            return
+
+        _show_mark(view, offset)
+
+
+class ToolRunnerGotoMark(sublime_plugin.WindowCommand):
+    _max_items = 1000
+
+    def run(self, kind=None, index=None):
+        view = _get_output_view(self.window)
+        mark_index = marks.get_index(view.id())
+
+        if mark_index is None:
+            util.notify("This output has no marks", target=view)
+            return
+
+        if kind is None:
+            counts = mark_index.get_counts()
+            self.window.show_quick_panel(
+                ["%s (%s)" % count for count in counts],
+                partial(self._on_kind_selected, view, mark_index, counts, index),
+                0,
+                0,
+                None,
+            )
+        else:
+            self._goto(view, mark_index, kind, index)
+
+    def _on_kind_selected(self, view, mark_index, counts, index, selected_index):
+        if selected_index >= 0:
+            kind = counts[selected_index][0]
+            sublime.set_timeout(partial(self._goto, view, mark_index, kind, index), 0)
+
+    def _goto(self, view, mark_index, kind, index):
+        if index is not None:
+            offset = mark_index.get(kind, index)
+            if offset is None:
+                util.notify("There is no %s mark %s" % (kind, index), target=view)
+            else:
+                _show_mark(view, offset)
+            return
+
+        offsets = mark_index.get_range(kind, 0, self._max_items)
+        items = [
+            "%s: %s" % (view.rowcol(offset)[0] + 1, view.substr(view.line(offset)))
+            for offset in offsets
+        ]
+
+        self.window.show_quick_panel(
+            items,
+            partial(self._on_mark_selected, view, offsets),
+            0,
+            0,
+            None,
+        )
+
+    def _on_mark_selected(self, view, offsets, selected_index):
+        if selected_index >= 0:
+            _show_mark(view, offsets[selected_index])
+
+
+class ToolRunnerRunFull(sublime_plugin.WindowCommand):
+    """Runs again the last run of the view without its preview size"""
+
+    def run(self):
+        view = self.window.active_view()
+        source_view = manager.get_source_view_for_target_view(view) or view
+
+        last_run = manager.get_last_run_for_source_view(source_view)
+
+        if last_run is None:
+            util.notify("There is no run to repeat for this view", source=view)
+            return
+
+        watch.rerun(
+            source_view, last_run, preview=dict(lines=None, bytes=None, rows=None)
+        )
+
+
+class ToolRunnerToggleWatch(sublime_plugin.WindowCommand):
+    def run(self):
+        watch.toggle(self.window.active_view())
+
+
 class ToolRunnerSwitchDefaultProfile(sublime_plugin.WindowCommand):
     def run(self, profile_group=None):
-        debug.log("Switching command for profile group: " + str(profile_group))
+        debug.log("Switching command for profile group:", profile_group)
         if profile_group is None:
             self.ask_group_and_switch_profile()
         else:
             self.switch_profile(profile_group)
 
     def ask_group_and_switch_profile(self):
-        self.groups = [group["name"] for group in settings.get_groups()]
+        groups = choices.get_groups()
+        self.groups = groups.names
 
         if len(self.groups) <= 0:
             sublime.error_message("There are no groups configured")
             return
 
         self.window.show_quick_panel(
-            self.groups,
+            groups.items,
             partial(self.on_ask_group_done, self.switch_profile),
             0,
             0,
@@ -182,17 +324,17 @@ class ToolRunnerSwitchDefaultProfile(sublime_plugin.WindowCommand):
             sublime.set_timeout(partial(callback, group_selected), 0)
 
     def switch_profile(self, profile_group):
-        profiles = settings.get_profiles(profile_group)
+        profiles = choices.get_profiles(profile_group)
 
         self.profile_group = profile_group
-        self.profile_list = [profile["name"] for profile in profiles]
-        self.window.show_quick_panel(self.profile_list, self.on_ask_profile, 0, 0, None)
+        self.profile_list = profiles.names
+        self.window.show_quick_panel(profiles.items, self.on_ask_profile, 0, 0, None)
 
     def on_ask_profile(self, selected_index):
 
         if selected_index > -1:
             selected_profile_name = self.profile_list[selected_index]
-            current_settings = settings.get_setting("default_profiles", {})
+            current_settings = dict(settings.get_setting("default_profiles", {}))
             current_settings[self.profile_group] = selected_profile_name
             settings.set_setting("default_profiles", current_settings)
 
@@ -208,12 +350,181 @@ class ToolRunnerOpenSettings(sublime_plugin.WindowCommand):
         settings.open_settings(self.window, scope)
 
 
+class ToolRunnerValidateTools(sublime_plugin.WindowCommand):
+    def run(self):
+        executables.forget()
+        sublime.set_timeout_async(self._validate, 0)
+
+    def _validate(self):
+        tools = [Tool(**tool_config) for tool_config in settings.get_tools()]
+        results = executables.validate_tools(tools)
+
+        missing = [result for result in results if result[2] is None]
+
+        lines = []
+        for name, executable, resolved in results:
+            if resolved is None:
+                lines.append("MISSING  %s: %s" % (name, executable))
+            else:
+                lines.append("OK       %s: %s" % (name, resolved))
+
+        view = self.window.new_file()
+        view.set_name("ToolRunner Tools")
+        view.set_scratch(True)
+        view.run_command("append", {"characters": "\n".join(lines) + "\n"})
+        view.set_read_only(True)
+
+        util.notify(
+            "%s of %s tools are available" % (len(results) - len(missing), len(results))
+        )
+
+
+class ToolRunnerHistory(sublime_plugin.WindowCommand):
+    def run(self, tool=None, profile=None, text=None):
+        if not history.is_enabled():
+            sublime.error_message("ToolRunner history is not enabled")
+            return
+
+        if text == "":
+            self.window.show_input_panel(
+                "Search ToolRunner history:",
+                "",
+                lambda text: self.run(tool, profile, text),
+                None,
+                None,
+            )
+            return
+
+        sublime.set_timeout_async(partial(self._show_runs, tool, profile, text), 0)
+
+    def _show_runs(self, tool, profile, text):
+        runs = history.find(tool=tool, profile=profile, text=text)
+
+        if len(runs) <= 0:
+            util.notify("There are no runs in history")
+            return
+
+        items = []
+        for run in runs:
+            started_at = datetime.datetime.fromtimestamp(run.started_at)
+            items.append(
+                [
+                    run.profile or run.tool,
+                    "%s, %.2f seconds, exit code %s"
+                    % (
+                        started_at.strftime("%Y-%m-%d %H:%M:%S"),
+                        run.duration or 0,
+                        run.exit_code,
+                    ),
+                ]
+            )
+
+        self.window.show_quick_panel(
+            items, partial(self._on_run_selected, runs), 0, 0, None
+        )
+
+    def _on_run_selected(self, runs, selected_index):
+        if selected_index < 0:
+            return
+
+        run = runs[selected_index]
+        started_at = datetime.datetime.fromtimestamp(run.started_at)
+
+        view = self.window.new_file()
+        view.set_name(
+            "ToolRunner History: %s (%s)"
+            % (run.profile or run.tool, started_at.strftime("%Y-%m-%d %H:%M:%S"))
+        )
+        view.set_scratch(True)
+
+        if run.syntax_file is not None:
+            view.set_syntax_file(run.syntax_file)
+
+        view.settings().set("line_numbers", False)
+        view.run_command("append", {"characters": run.get_output()})
+
+
+class ToolRunnerDumpLog(sublime_plugin.WindowCommand):
+    def run(self):
+        lines = debug.dump()
+
+        view = self.window.new_file()
+        view.set_name("ToolRunner Log")
+        view.set_scratch(True)
+        view.run_command("append", {"characters": "\n".join(lines) + "\n"})
+        view.set_read_only(True)
+
+
+class ToolRunnerOpenProfile(sublime_plugin.WindowCommand):
+    def run(self):
+        report = profiling.get_latest_report()
+
+        if report is None:
+            util.notify("There are no profile reports, enable profile_runs")
+            return
+
+        self.window.open_file(report)
+
+
+class ToolRunnerClearView(sublime_plugin.TextCommand):
+    """Empties an output view in a single edit, keeping its settings"""
+
+    def run(self, edit):
+        read_only = self.view.is_read_only()
+
+        if read_only:
+            self.view.set_read_only(False)
+
+        self.view.erase(edit, sublime.Region(0, self.view.size()))
+        marks.forget(self.view.id())
+
+        if read_only:
+            self.view.set_read_only(True)
+
+
 class ToolRunnerListener(sublime_plugin.EventListener):
     def on_close(self, view):
+        marks.forget(view.id())
+        watch.forget(view)
         manager.remove_source_view(view)
         manager.remove_target_view(view)
 
+    def on_activated_async(self, view):
+        prewarm_groups = settings.get_setting("prewarm_groups")
+        window = view.window()
+
+        if not prewarm_groups or window is None:
+            return
+
+        for selector, group in prewarm_groups.items():
+            if view.match_selector(0, selector):
+                profile = settings.get_setting("default_profiles", {}).get(group)
+                if profile is not None:
+                    Command(window, {}, source_view=view).prewarm_profile(
+                        group, profile
+                    )
+                return
+
+    def on_pre_close_window(self, window):
+        manager.forget_window(window)
+        util.invalidate_expansions(window)
+
+    def on_load_project(self, window):
+        util.invalidate_expansions(window)
+
+    def on_post_window_command(self, window, command_name, args):
+        if command_name in (
+            "rename_file",
+            "rename_path",
+            "close_project",
+            "close_workspace",
+        ):
+            util.invalidate_expansions(window)
+
     def on_post_save(self, view):
+        util.invalidate_expansions(view.window())
+        watch.on_saved(view)
+
         # debug.log("Saved view: %s" % view.id())
         source_view = manager.get_source_view_for_target_view(view)
         if source_view is None:
@@ -225,14 +536,35 @@ class ToolRunnerListener(sublime_plugin.EventListener):
         view.set_read_only(False)
 
 
+def _configure_history():
+    path = None
+
+    if settings.get_setting("history_enabled"):
+        path = os.path.join(
+            sublime.cache_path(), settings.basepackage, "history.sqlite3"
+        )
+
+    history.configure(
+        path=path,
+        max_bytes=settings.get_setting("history_max_mb", 100) * 1024 * 1024,
+        max_age_days=settings.get_setting("history_max_age_days", 30),
+    )
+
+
 def plugin_loaded():
     debug.log("Plugin Loading")
     settings.on_loaded()
+    choices.configure(
+        os.path.join(sublime.cache_path(), settings.basepackage, "choices.json")
+    )
+    _configure_history()
+    settings.register_on_change(_configure_history)
     debug.log("Plugin Loaded")
     if settings.get_setting("devel"):
         debug.forget_modules()
 
 
 def plugin_unloaded():
+    prewarm.evict_all()
     settings.on_unloaded()
     debug.log("Plugin Unloaded")
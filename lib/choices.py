@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+
+from . import debug, settings
+
+_lock = threading.Lock()
+
+# Choices of every kind, with the settings they were built from
+_cache = dict()
+
+_path = None
+_recent = None
+
+_max_recent = 50
+
+
+class Choices(object):
+    """Names and quick panel items, in the same order"""
+
+    def __init__(self, names, items):
+        self.names = names
+        self.items = items
+
+    def __len__(self):
+        return len(self.names)
+
+
+def configure(path=None):
+    """Sets the file the recent choices are kept in"""
+    global _path, _recent
+
+    with _lock:
+        if path != _path:
+            _path = path
+            _recent = None
+            _cache.clear()
+
+
+def get_tools():
+    return _get_choices("tool", settings.get_tools(), _tool_item)
+
+
+def get_groups():
+    return _get_choices("group", settings.get_groups(), _group_item)
+
+
+def get_profiles(group_name):
+    group = settings.get_group(group_name)
+
+    if group is None:
+        return Choices([], [])
+
+    default = settings.get_setting("default_profiles", {}).get(group_name)
+
+    return _get_choices(
+        "profile/%s" % group_name,
+        group["profiles"],
+        lambda profile: _profile_item(group, profile, default),
+    )
+
+
+def mark_used(kind, name):
+    """Moves name first in the choices of kind and saves it"""
+    with _lock:
+        recent = _load_recent()
+        names = recent.get(kind, [])
+
+        if len(names) > 0 and names[0] == name:
+            return
+
+        recent[kind] = ([name] + [other for other in names if other != name])[
+            :_max_recent
+        ]
+        _cache.pop(kind, None)
+
+        _save_recent(recent)
+
+
+def mark_profile_used(group_name, profile_name):
+    mark_used("group", group_name)
+    mark_used("profile/%s" % group_name, profile_name)
+
+
+def _get_choices(kind, source, build_item):
+    with _lock:
+        # Snapshots never change, another object means the settings changed
+        cached = _cache.get(kind)
+        if cached is not None and cached[0] is source:
+            return cached[1]
+
+        recent = _load_recent().get(kind, [])
+
+    debug.log("Building quick panel items for", kind)
+
+    entries = [(entry["name"], build_item(entry)) for entry in source]
+
+    rank = dict((name, index) for index, name in enumerate(recent))
+    entries.sort(key=lambda entry: rank.get(entry[0], len(rank)))
+
+    choices = Choices(
+        [name for name, item in entries], [item for name, item in entries]
+    )
+
+    with _lock:
+        _cache[kind] = (source, choices)
+
+    return choices
+
+
+def _tool_item(tool):
+    name = tool["name"]
+    desc = tool.get("desc")
+    cmd = tool.get("cmd")
+
+    if isinstance(cmd, list):
+        cmd = " ".join(cmd)
+
+    return [name if desc is None else "%s (%s)" % (desc, name), "Command: %s" % cmd]
+
+
+def _group_item(group):
+    return [
+        group["name"],
+        "%s profiles, tool %s" % (len(group.get("profiles", [])), group.get("tool")),
+    ]
+
+
+def _profile_item(group, profile, default):
+    name = profile["name"]
+    details = profile.get("desc") or "Tool: %s" % profile.get("tool", group.get("tool"))
+
+    if name == default:
+        details += " (default)"
+
+    return [name, details]
+
+
+def _load_recent():
+    global _recent
+
+    if _recent is not None:
+        return _recent
+
+    _recent = dict()
+
+    if _path is None or not os.path.exists(_path):
+        return _recent
+
+    try:
+        with open(_path, encoding="utf-8") as recent_file:
+            loaded = json.load(recent_file)
+    except (OSError, ValueError) as e:
+        debug.warning("Unable to read recent choices:", e)
+        return _recent
+
+    if isinstance(loaded, dict):
+        _recent = loaded
+
+    return _recent
+
+
+def _save_recent(recent):
+    if _path is None:
+        return
+
+    temp_path = _path + ".tmp"
+
+    try:
+        os.makedirs(os.path.dirname(_path), exist_ok=True)
+
+        with open(temp_path, "w", encoding="utf-8") as recent_file:
+            json.dump(recent, recent_file)
+
+        os.replace(temp_path, _path)
+    except OSError as e:
+        debug.warning("Unable to save recent choices:", e)
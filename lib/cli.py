@@ -0,0 +1,199 @@
+"""
+Runs ToolRunner tools from the command line, outside Sublime Text.
+
+    python -m lib.cli --tool python script.py
+    python -m lib.cli --group mssql --profile local --param database=test query.sql
+    echo "print(42)" | python -m lib.cli --tool python
+
+Tools, groups and profiles are read from the package settings plus the
+files given with --settings. The output of the tool is written to stdout
+and the exit code of the tool is returned.
+"""
+import argparse
+import os
+import sys
+import threading
+from os import path
+
+from . import debug, settings
+from .execution import Execution
+
+_flag_values = {"true": True, "false": False}
+
+_default_settings = path.join(
+    path.dirname(path.dirname(path.abspath(__file__))), "ToolRunner.sublime-settings"
+)
+
+
+class _CliExecution(Execution):
+    def __init__(self, command_arguments, input_path, working_directory, output):
+        Execution.__init__(self, command_arguments)
+        self._input_path = input_path
+        self._working_directory = working_directory
+        self._output = output
+        self.message = None
+        self._done = threading.Event()
+
+    def run_tool(self, tool_id):
+        if self._create_tool(tool_id) is None:
+            self._notify("There is no tool named %s" % tool_id)
+            return None
+
+        self._desc = self._tool.name
+
+        self._tool.set_command_arguments(self._command_arguments)
+
+        return self._run_and_wait()
+
+    def run_profile(self, selected_group, selected_profile):
+        if not self._create_profile_tool(selected_group, selected_profile):
+            return None
+
+        return self._run_and_wait()
+
+    def _run_and_wait(self):
+        self._begin_run()
+
+        if self._process is None:
+            return None
+
+        # Waiting on an event, an interrupted Thread.join() can return early
+        try:
+            while not self._done.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            self.cancel()
+            self._done.wait()
+
+        self._output.flush()
+
+        # The tool was stopped on purpose, the preview is a success
+        if self._preview_reached is not None:
+            return 0
+
+        return self._process.returncode
+
+    def _command_monitor_worker(self):
+        try:
+            Execution._command_monitor_worker(self)
+        finally:
+            self._done.set()
+
+    def _extract_input(self):
+        tool = self._tool
+
+        if tool.input_source == "none" or tool.input.mode == "none":
+            input_text = ""
+        elif self._input_path is None or self._input_path == "-":
+            input_text = sys.stdin.read()
+        else:
+            with open(self._input_path, encoding="utf-8") as input_file:
+                input_text = input_file.read()
+
+        if input_text != "" and input_text[-1] != "\n":
+            input_text += "\n"
+
+        self._input_text = input_text
+        return input_text
+
+    def _create_working_directory(self):
+        pass
+
+    def write(self, text):
+        self._output.write(text)
+
+    def _notify(self, msg):
+        debug.log("[%s]" % self._desc, msg)
+        self.message = msg
+
+    def _finish_output(self, timedelta):
+        debug.log("[%s]" % self._desc, "Complete on", timedelta.total_seconds())
+
+
+def _parse_param(text):
+    key, separator, value = text.partition("=")
+
+    if separator == "":
+        raise argparse.ArgumentTypeError("expected key=value, got %s" % text)
+
+    return key, _flag_values.get(value.lower(), value)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m lib.cli", description="Runs a ToolRunner tool or profile"
+    )
+    parser.add_argument(
+        "input",
+        nargs="?",
+        help="file to use as input, stdin when missing or -",
+    )
+    parser.add_argument("-t", "--tool", help="name of the tool to run")
+    parser.add_argument("-g", "--group", help="group of the profile to run")
+    parser.add_argument("-p", "--profile", help="name of the profile to run")
+    parser.add_argument(
+        "-a",
+        "--param",
+        action="append",
+        default=[],
+        type=_parse_param,
+        metavar="KEY=VALUE",
+        help="value for a tool parameter, true or false for flags",
+    )
+    parser.add_argument(
+        "-s",
+        "--settings",
+        action="append",
+        default=[],
+        metavar="FILE",
+        help="settings file with tools and groups, the last one wins",
+    )
+    parser.add_argument(
+        "-C", "--cwd", default=os.getcwd(), help="working directory of the tool"
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="log to stderr while running"
+    )
+
+    args = parser.parse_args(argv)
+
+    if (args.tool is None) == (args.group is None):
+        parser.error("either --tool or --group and --profile are required")
+
+    if args.group is not None and args.profile is None:
+        parser.error("--profile is required with --group")
+
+    return args
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+
+    debug.console_stream = sys.stderr
+    settings.load_files(list(reversed(args.settings)) + [_default_settings])
+    debug.enabled = args.verbose
+
+    command_arguments = dict()
+    if len(args.param) > 0:
+        command_arguments["params"] = dict(args.param)
+
+    execution = _CliExecution(command_arguments, args.input, args.cwd, sys.stdout)
+
+    if args.tool is not None:
+        exit_code = execution.run_tool(args.tool)
+    else:
+        exit_code = execution.run_profile(args.group, args.profile)
+
+    if exit_code is None:
+        sys.stderr.write("toolrunner: %s\n" % execution.message)
+        return 2
+
+    if exit_code < 0:
+        # Killed by a signal, report it the way shells do
+        return 128 - exit_code
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
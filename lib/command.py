@@ -1,38 +1,35 @@
 import datetime
 import os
 import re
-import subprocess
-import sys
-import tempfile
 from os import path
-from threading import Thread
 
 import sublime
 
-from . import debug, manager, settings, util
-from .tool import Tool
+from . import debug, diff, manager, marks, settings, singleflight, util
+from .execution import Execution, NoContext
+from .writer import BatchWriter
 
 
-class Command(object):
-    def __init__(self, source_window, command_arguments):
+class Command(Execution):
+    def __init__(self, source_window, command_arguments, source_view=None):
+        Execution.__init__(self, command_arguments)
+
         self._source_window = source_window
-        self._source_view = source_window.active_view()
+        self._source_view = (
+            source_view if source_view is not None else source_window.active_view()
+        )
         self._target_view = None
+        self._scanner = None
+        self._marks = None
 
-        self._command_arguments = command_arguments
-
-        self._running = False
-        self._cancelled = False
-
-        self._tool = None
-
-        self._desc = None
+        # Run led or followed, see _follow_existing()
+        self._flight = None
 
-        self._process = None
+        # Exclusive commands replace the running command of the source view
+        self._exclusive = True
 
-        self._input_text = None
-        self._input_file = None
-        self._output_file = None
+        # Prewarming runs unasked, its problems are only logged
+        self._quiet = False
 
     def run_tool(self, tool_id):
         debug.log("Running command for tool: ", tool_id, self._command_arguments)
@@ -45,54 +42,46 @@ class Command(object):
 
         self._tool.set_command_arguments(self._command_arguments)
 
-        self._run_thread()
-
-    def run_profile(self, selected_group, selected_profile):
-        group_descriptor = None
-        profile_descriptor = None
+        manager.set_last_run_for_source_view(
+            self._source_view, dict(tool=tool_id, args=self._command_arguments)
+        )
 
-        group_list = settings.get_groups()
+        self._run_thread()
 
-        for single_group in group_list:
-            if single_group["name"] == selected_group:
-                group_descriptor = single_group
-                break
+    def prewarm_tool(self, tool_id):
+        """Parks a process for the tool so the next run can skip startup"""
+        self._quiet = True
 
-        for single_profile in group_descriptor["profiles"]:
-            if single_profile["name"] == selected_profile:
-                profile_descriptor = single_profile
+        if self._create_tool(tool_id) is None:
+            return
 
-        debug.log("Running command for profile: ", profile_descriptor)
+        self._tool.set_command_arguments(self._command_arguments)
 
-        tool_id = profile_descriptor.get("tool", group_descriptor.get("tool"))
+        self._prewarm()
 
-        if self._create_tool(tool_id) is None:
-            self._notify("There is no tool named: %s" % tool_id)
+    def run_profile(self, selected_group, selected_profile):
+        if not self._create_profile_tool(selected_group, selected_profile):
             return
 
-        self._desc = "%s/%s" % (selected_group, selected_profile)
-
-        self._tool.set_command_arguments(
-            group_descriptor, profile_descriptor, self._command_arguments
+        manager.set_last_run_for_source_view(
+            self._source_view,
+            dict(
+                group=selected_group,
+                profile=selected_profile,
+                args=self._command_arguments,
+            ),
         )
 
         self._run_thread()
 
-    def cancel(self, wait=False):
-        self._cancelled = True
-        self._process.terminate()
-        if wait:
-            self._main_thread.join()
-
-    def _create_tool(self, tool_id):
-        tool_config = settings.get_tool(tool_id)
-
-        if tool_config is None:
-            return None
+    def prewarm_profile(self, selected_group, selected_profile):
+        """Parks a process for the profile so the next run can skip startup"""
+        self._quiet = True
 
-        self._tool = Tool(**tool_config)
+        if not self._create_profile_tool(selected_group, selected_profile):
+            return
 
-        return self._tool
+        self._prewarm()
 
     def _extract_input(self):
         input_source = self._tool.input_source
@@ -150,135 +139,11 @@ class Command(object):
         self._input_text = input_text
         return input_text
 
-    def _create_temp_input_file(self):
-        input = self._tool.input
-        input_text = self._input_text
-
-        opts = dict(delete=False)
-
-        opts["prefix"] = "toolrunner."
-
-        if input.file_suffix is not None:
-            opts["suffix"] = input.file_suffix
-
-        with tempfile.NamedTemporaryFile(**opts) as tmpfile:
-            tmpfile.write(bytes(input_text, input.codec))
-            input_file = path.normpath(tmpfile.name)
-
-        if sys.platform == "win32":
-            # Fixing input file path in windows
-            input_file = input_file.replace("\\", "\\\\")
-
-        self._input_file = input_file
-
-        debug.log("Created input file: %s" % input_file)
-
-        return input_file
-
-    def _create_temp_output_file(self):
-        with tempfile.NamedTemporaryFile(delete=False, prefix="toolrunner-") as tmpfile:
-            self._output_file = tmpfile.name
-
-        debug.log("Created output file: %s" % self._output_file)
-
-        return self._output_file
-
-    def _run_thread(self):
-        self._main_thread = Thread(target=self._begin_run)
-        self._main_thread.start()
-
-    def _begin_run(self):
-        tool = self._tool
-
-        self._extract_input()
-
-        input_text = self._input_text
-
-        if input_text == "" and not tool.input.allow_empty:
-            self._notify("This tool does not allow empty input")
-            return
-
-        self._create_command_line()
-        debug.log("Using Command Line: %s" % self._command_array)
-
-        self._create_working_directory()
-        debug.log("Using Working Directory: %s" % self._working_directory)
-
-        if tool.output.mode != "none":
-            manager.cancel_command_for_source_view(self._source_view, True)
-
-        self._execution_cancelled = False
-
-        self.starttime = datetime.datetime.now()
-
-        self._notify("Running...")
-
-        self._run_process()
-
-        if self._process is None:
-            self._notify("Executable not found")
-            return
-
-        if tool.output.mode != "none":
-            manager.set_current_command_for_source_view(self._source_view, self)
-
-        self._begin_write()
-        self._running = True
-
-        self._thread = Thread(target=self._command_monitor_worker)
-        self._thread.start()
-
-    def _command_monitor_worker(self):
-        """
-        This must be called in it's own thread as it will block while
-        the process is running, and while the process is reading the
-        output
-        """
-        tool = self._tool
-        process = self._process
-
-        self._read_thread = None
+    def _finish_output(self, timedelta):
+        usage = "" if self._usage is None else ", %s" % self._usage
 
-        if tool.output.mode == "pipe":
-
-            def outputreader():
-                while True:
-                    if self._cancelled:
-                        break
-                    outstring = (
-                        process.stdout.readline()
-                        .decode(tool.output.codec, "replace")
-                        .replace("\r", "")
-                    )
-                    if outstring == "":
-                        break
-                    self.write(outstring)
-
-            self._read_thread = Thread(target=outputreader)
-            self._read_thread.start()
-
-        self._process.wait()
-        self._lock = True
-
-        if self._read_thread is not None:
-            self._read_thread.join()
-
-        self._end_run()
-
-    def _end_run(self):
-        tool = self._tool
-        if tool.output.mode == "none":
-            return
-
-        self.endtime = datetime.datetime.now()
-        timedelta = self.endtime - self.starttime
-
-        self._write_output()
-
-        if self._cancelled:
-            self.write("\n:: Execution cancelled ::\n")
-
-        self.write("\n:: End at %s ::\n" % self.endtime)
+        # Not sent to followers, each one writes its own
+        self._append("\n:: End at %s%s ::\n" % (self.endtime, usage))
 
         self._target_view.sel().clear()
         self._target_view.sel().add(self._current_cursor_position)
@@ -287,16 +152,22 @@ class Command(object):
 
         if self._cancelled:
             self._notify("Cancelled at %s seconds" % timedelta.total_seconds())
+        elif self._limit_reached is not None:
+            self._notify(
+                "Stopped at %s seconds: %s limit reached"
+                % (timedelta.total_seconds(), self._limit_reached)
+            )
+        elif self._preview_reached is not None:
+            self._notify(
+                "Preview of the first %s in %s seconds"
+                % (self._preview_reached, timedelta.total_seconds())
+            )
         else:
             self._notify("Complete on %s seconds" % timedelta.total_seconds())
 
         viewport_position = self._target_view.text_to_layout(begin)
         self._target_view.set_viewport_position(viewport_position)
 
-        manager.set_current_command_for_source_view(self._source_view, None)
-
-        self._clean()
-
         manager.ensure_visible_view(self._target_view)
 
     def _create_window(self):
@@ -314,9 +185,11 @@ class Command(object):
 
         self._target_view.set_read_only(tool.results.read_only)
         self._target_view.set_scratch(tool.results.scratch)
-        self._target_view.set_syntax_file(
-            util.expand(tool.results.syntax_file, self._source_view)
-        )
+
+        # Reused panels already have it, setting it again reparses the view
+        syntax_file = self._get_syntax_file()
+        if self._target_view.settings().get("syntax") != syntax_file:
+            self._target_view.set_syntax_file(syntax_file)
 
         self._target_view.settings().set("line_numbers", False)
         self._target_view.settings().set("translate_tabs_to_spaces", False)
@@ -324,6 +197,19 @@ class Command(object):
         manager.ensure_visible_view(self._target_view)
 
     def write(self, text):
+        flight = self._flight
+
+        if flight is None or flight.leader is not self:
+            self._append(text)
+            return
+
+        with flight.lock:
+            for follower in flight.followers:
+                follower._append(text)
+
+            self._append(text)
+
+    def _append(self, text):
         if self._target_view is None or self._target_view.window() is None:
             return
             # self._create_window()
@@ -333,40 +219,42 @@ class Command(object):
         if read_only:
             self._target_view.set_read_only(False)
 
+        if self._scanner is not None:
+            self._scanner.scan(text, self._target_view.size(), self._marks)
+
         self._target_view.run_command("append", {"characters": text})
 
         if read_only:
             self._target_view.set_read_only(True)
 
     def _notify(self, msg):
+        if self._quiet:
+            Execution._notify(self, msg)
+            return
+
         util.notify(
             msg, desc=self._desc, source=self._source_view, target=self._target_view
         )
 
-    def _create_command_line(self):
-        tool = self._tool
-
-        command_array = tool.get_command_array()
-
-        debug.log("Command array: ", command_array)
+    def _set_status(self, msg):
+        util.set_status(
+            msg, desc=self._desc, source=self._source_view, target=self._target_view
+        )
 
-        for i in range(len(command_array)):
-            input_re = re.escape(r"$[toolrunner_input_file]")
-            if re.search(input_re, command_array[i]):
-                if tool.input.mode == "tmpfile-path":
-                    command_array[i] = re.sub(
-                        input_re, self._create_temp_input_file(), command_array[i]
-                    )
+    def _get_syntax_file(self):
+        return util.expand(self._tool.results.syntax_file, self._source_view)
 
-            if command_array[i] == "$[toolrunner_input_text]":
-                if tool.input.mode == "cmdline":
-                    command_array[i] = self._input_text
+    def _cancel_previous(self):
+        if self._exclusive:
+            manager.cancel_command_for_source_view(self._source_view, True)
 
-            if command_array[i] == "$[toolrunner_output_file]":
-                if tool.output.mode == "tmpfile-path":
-                    command_array[i] = self._create_temp_output_file()
+    def _claim(self):
+        if self._exclusive:
+            manager.set_current_command_for_source_view(self._source_view, self)
 
-        self._command_array = command_array
+    def _release(self):
+        if self._exclusive:
+            manager.clear_current_command_for_source_view(self._source_view, self)
 
     # Create partial data
     def _create_working_directory(self):
@@ -387,65 +275,24 @@ class Command(object):
 
         self._working_directory = working_directory
 
-    def _run_process(self):
+    def _begin_write(self):
         tool = self._tool
 
-        startupinfo = None
-        process = None
-        stdin = None
-        stdout = None
-        stderr = None
-
-        if sublime.platform() == "windows":
-            if tool.output.mode != "none":
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.CREATE_NEW_CONSOLE
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-        if tool.output.mode != "none":
-            stdin = subprocess.PIPE
-
-        if tool.output.mode == "tmpfile-pipe":
-            self._create_temp_output_file()
-            stdout = open(self._output_file, "wb+")
-            stderr = subprocess.STDOUT
-        elif tool.output.mode == "none":
-            pass
-        else:
-            stdout = subprocess.PIPE
-            stderr = subprocess.STDOUT
-
-        try:
-            process = subprocess.Popen(
-                self._command_array,
-                stdin=stdin,
-                stdout=stdout,
-                stderr=stderr,
-                shell=tool.shell,
-                startupinfo=startupinfo,
-                cwd=self._working_directory,
-            )
-
-        except FileNotFoundError as e:
-            debug.log("Error: ", e)
+        if tool.output.mode == "none":
             return
 
-        self._stdout = stdout if process.stdout is None else process.stdout
+        flight_lock = NoContext() if self._flight is None else self._flight.lock
 
-        if tool.input.mode == "pipe":
-            process.stdin.write(self._input_text.encode(tool.input.codec, "replace"))
+        with flight_lock:
+            self._prepare_target_view()
 
-        if process.stdin is not None:
-            process.stdin.close()
+            self.write(":: Start at %s ::\n" % self.starttime)
 
-        self._process = process
-
-    def _begin_write(self):
-        tool = self._tool
+            self._target_view.run_command("move_to", {"to": "eof"})
 
-        if tool.output.mode == "none":
-            return
+        self._writer = BatchWriter(self._profiled("write", self.write))
 
+    def _prepare_target_view(self):
         self._create_window()
 
         self._target_view.run_command("move_to", {"to": "eof"})
@@ -454,10 +301,10 @@ class Command(object):
         current_line = self._target_view.line(current_cursor_position)
 
         if current_cursor_position.a > current_line.a:
-            self.write("\n")
+            self._append("\n")
 
         if current_cursor_position.a != 0:
-            self.write("\n")
+            self._append("\n")
             current_cursor_position = sublime.Region(
                 current_cursor_position.a + 1, current_cursor_position.a + 1
             )
@@ -467,24 +314,144 @@ class Command(object):
         self._target_view.sel().clear()
         self._target_view.sel().add(current_cursor_position)
 
-        self.write(":: Start at %s ::\n" % self.starttime)
+        self._begin_marks()
 
-        self._target_view.run_command("move_to", {"to": "eof"})
+    def _begin_marks(self):
+        if len(self._tool.marks) == 0:
+            return
 
-    def _write_output(self):
-        if self._output_file:
-            with open(
-                self._output_file, mode="r", encoding=self._tool.output.codec
-            ) as tmpfile:
-                outlines = [line.replace("\r\n", "\n") for line in tmpfile]
-                # debug.log(outstring)
-            self.write(outlines)
-
-    def _clean(self):
-        if self._input_file:
-            debug.log("Eliminando: %s" % self._input_file)
-            os.unlink(self._input_file)
-
-        if self._output_file:
-            debug.log("Eliminando: %s" % self._output_file)
-            os.unlink(self._output_file)
+        try:
+            self._scanner = marks.Scanner(self._tool.marks)
+        except re.error as e:
+            self._notify("Invalid mark pattern: %s" % e)
+            return
+
+        self._marks = marks.get_index(self._target_view.id(), create=True)
+        self._marks.truncate(self._target_view.size())
+
+    def _follow_existing(self):
+        """
+        Joins the identical run of another view instead of starting one:
+        same tool, arguments, run settings, working directory and input. The
+        output so far is copied and the rest is written as the leader
+        receives it.
+        """
+        tool = self._tool
+
+        if (
+            not self._exclusive
+            or tool.output.mode == "none"
+            or not settings.get_setting("single_flight", True)
+        ):
+            return False
+
+        key = diff.run_key(
+            tool.name,
+            tool.get_command_array(),
+            self._working_directory,
+            self._input_text,
+            tool.input.as_key(),
+            tool.output.as_key(),
+            tool.results.as_key(),
+            tool.limits.as_key(),
+            tool.batches.as_key(),
+            tool.preview.as_key(),
+            tool.filters.as_key(),
+        )
+
+        flight = singleflight.join(key, self)
+        leader = flight.leader
+
+        if leader is self:
+            self._flight = flight
+            return False
+
+        if leader._source_view.id() == self._source_view.id():
+            self._notify("The same run is already in progress")
+            return True
+
+        self._cancel_previous()
+
+        with flight.lock:
+            if flight.finished:
+                return False
+
+            self._prepare_target_view()
+            self._append(leader._get_output())
+
+            self._flight = flight
+            flight.followers.append(self)
+
+            self._claim()
+
+        self._notify("Following the same run of %s" % leader._source_view.name())
+
+        return True
+
+    def _get_output(self):
+        """Text written to the output view by this run so far"""
+        if self._target_view is None or self._target_view.window() is None:
+            return ""
+
+        return self._target_view.substr(
+            sublime.Region(
+                self._current_cursor_position.begin(), self._target_view.size()
+            )
+        )
+
+    def _begin_run(self):
+        try:
+            Execution._begin_run(self)
+        finally:
+            if self._process is None:
+                self._end_flight()
+
+    def _command_monitor_worker(self):
+        try:
+            Execution._command_monitor_worker(self)
+        finally:
+            self._end_flight()
+
+    def _end_flight(self):
+        flight = self._flight
+
+        if flight is None or flight.leader is not self:
+            return
+
+        for follower in singleflight.finish(flight):
+            follower._end_following(self)
+
+    def _end_following(self, leader):
+        self._flight = None
+        self.endtime = datetime.datetime.now()
+        self.starttime = getattr(leader, "starttime", self.endtime)
+
+        if leader._process is None and not self._cancelled:
+            self._notify("The run it followed could not start")
+            self._release()
+            return
+
+        self._cancelled = self._cancelled or leader._cancelled
+        self._limit_reached = leader._limit_reached
+        self._preview_reached = leader._preview_reached
+        self._usage = leader._usage
+
+        self._finish_output(self.endtime - self.starttime)
+        self._release()
+
+    def cancel(self, wait=False):
+        flight = self._flight
+
+        if flight is None or flight.leader is self:
+            Execution.cancel(self, wait)
+            return
+
+        # Only this view stops following, the run goes on for the others
+        with flight.lock:
+            if self not in flight.followers:
+                return
+            flight.followers.remove(self)
+
+        self._cancelled = True
+        self._append("\n:: Execution cancelled ::\n")
+        self._end_following(flight.leader)
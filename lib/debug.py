@@ -1,17 +1,193 @@
 import datetime
+import os
+import reprlib
 import sys
+import threading
+import time
+from collections import deque
 
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+_level_names = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+# Echo debug records to the console. Warnings and errors are always echoed.
 enabled = True
 
+# Where console records are printed, None means sys.stdout
+console_stream = None
+
+_history = deque(maxlen=1000)
+_history_level = DEBUG
+
+_file_lock = threading.Lock()
+_file_path = None
+_file_level = WARNING
+_file_max_bytes = 1024 * 1024
+_file_backups = 3
+
+# Containers are cut short when a record is formatted, so logging a large
+# one stays cheap
+_repr = reprlib.Repr()
+_repr.maxlevel = 4
+_repr.maxdict = 50
+_repr.maxlist = _repr.maxtuple = _repr.maxset = _repr.maxfrozenset = 100
+_repr.maxdeque = _repr.maxarray = 100
+_repr.maxstring = _repr.maxother = 1000
+
+
+class lazy(object):
+    """Defers an expensive log argument until the record is formatted"""
+
+    __slots__ = ("_fn",)
+
+    def __init__(self, fn):
+        self._fn = fn
+
+    def __str__(self):
+        return str(self._fn())
+
+
+def level_for_name(name, default=WARNING):
+    if isinstance(name, int):
+        return name
+
+    for level, level_name in _level_names.items():
+        if level_name == str(name).upper():
+            return level
+
+    return default
+
+
+def configure(
+    history_size=None,
+    history_level=None,
+    file_path=None,
+    file_level=None,
+    file_max_bytes=None,
+    file_backups=None,
+):
+    global _history, _history_level
+    global _file_path, _file_level, _file_max_bytes, _file_backups
+
+    if history_size is not None and history_size != _history.maxlen:
+        _history = deque(_history, maxlen=max(0, history_size))
+
+    if history_level is not None:
+        _history_level = level_for_name(history_level, DEBUG)
+
+    with _file_lock:
+        _file_path = file_path
+        if file_level is not None:
+            _file_level = level_for_name(file_level)
+        if file_max_bytes is not None:
+            _file_max_bytes = file_max_bytes
+        if file_backups is not None:
+            _file_backups = file_backups
+
 
 def log(*args):
-    if enabled:
-        print(
-            *(
-                ["[ToolRunner][%s]" % datetime.datetime.now().strftime("%H:%M:%S.%f")]
-                + list(args)
-            )
-        )
+    _record(DEBUG, args)
+
+
+def info(*args):
+    _record(INFO, args)
+
+
+def warning(*args):
+    _record(WARNING, args)
+
+
+def error(*args):
+    _record(ERROR, args)
+
+
+def _record(level, args):
+    # Keep this path cheap: arguments are only stringified when the record
+    # is kept or emitted. They are stringified right away, so the history
+    # shows them as they were and holds no reference to them.
+    console = enabled or level >= WARNING
+    to_file = _file_path is not None and level >= _file_level
+
+    if level < _history_level and not console and not to_file:
+        return
+
+    record = (time.time(), level, " ".join(_to_text(arg) for arg in args))
+
+    if level >= _history_level:
+        _history.append(record)
+
+    if console:
+        print(_format(record), file=console_stream)
+
+    if to_file:
+        _write_file([_format(record)])
+
+
+def _to_text(arg):
+    if isinstance(arg, (list, tuple, dict, set, frozenset, deque)):
+        return _repr.repr(arg)
+
+    return str(arg)
+
+
+def _format(record):
+    timestamp, level, message = record
+    return "[ToolRunner][%s][%s] %s" % (
+        datetime.datetime.fromtimestamp(timestamp).strftime("%H:%M:%S.%f"),
+        _level_names.get(level, level),
+        message,
+    )
+
+
+def history():
+    return [_format(record) for record in list(_history)]
+
+
+def dump(path=None):
+    """Writes the in-memory history to path or to the configured log file"""
+    lines = history()
+
+    if path is not None:
+        with open(path, "w", encoding="utf-8") as dumpfile:
+            dumpfile.writelines(line + "\n" for line in lines)
+    elif _file_path is not None:
+        _write_file(lines)
+
+    return lines
+
+
+def _write_file(lines):
+    with _file_lock:
+        if _file_path is None:
+            return
+
+        try:
+            _rotate_file()
+            with open(_file_path, "a", encoding="utf-8") as logfile:
+                logfile.writelines(line + "\n" for line in lines)
+        except OSError as e:
+            print("[ToolRunner] Unable to write log file %s: %s" % (_file_path, e))
+
+
+def _rotate_file():
+    try:
+        if os.path.getsize(_file_path) < _file_max_bytes:
+            return
+    except OSError:
+        return
+
+    for idx in range(_file_backups - 1, 0, -1):
+        source = "%s.%s" % (_file_path, idx)
+        if os.path.exists(source):
+            os.replace(source, "%s.%s" % (_file_path, idx + 1))
+
+    if _file_backups > 0:
+        os.replace(_file_path, _file_path + ".1")
+    else:
+        os.unlink(_file_path)
 
 
 def forget_modules():
@@ -0,0 +1,175 @@
+import codecs
+import hashlib
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+from . import debug
+
+_max_stored_outputs = 32
+_chunk_size = 64 * 1024
+
+_lock = threading.Lock()
+_stored_outputs = OrderedDict()
+
+
+class _StoredOutput(object):
+    """Output of a run kept as line hashes plus the compressed text"""
+
+    def __init__(self, hashes, blob):
+        self.hashes = hashes
+        self.blob = blob
+
+    def size(self):
+        return len(self.blob) + self.hashes.itemsize * len(self.hashes)
+
+
+def run_key(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(repr(part).encode("utf-8", "replace"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class OutputDiffer(object):
+    """
+    Receives the output of a run and, at the end, yields only the hunks
+    that changed against the previous output stored for the same key.
+    When there is no previous output nothing is yielded, the output is
+    only stored for the next run.
+    """
+
+    def __init__(self, key):
+        self._key = key
+        self._hashes = array("q")
+        self._compressor = zlib.compressobj()
+        self._chunks = []
+        self._pending = ""
+
+        with _lock:
+            self._previous = _stored_outputs.get(key)
+
+    def has_previous(self):
+        return self._previous is not None
+
+    def feed(self, text):
+        text = self._pending + text
+        lines = text.split("\n")
+        self._pending = lines.pop()
+
+        for line in lines:
+            self._add_line(line)
+
+    def _add_line(self, line):
+        self._hashes.append(hash(line))
+        self._chunks.append(self._compressor.compress((line + "\n").encode("utf-8")))
+
+    def finish(self):
+        """Stores this output and yields the text to show for it"""
+        current = self._close()
+
+        with _lock:
+            _stored_outputs.pop(self._key, None)
+            _stored_outputs[self._key] = current
+            while len(_stored_outputs) > _max_stored_outputs:
+                _stored_outputs.popitem(last=False)
+
+        debug.log("Stored output for diff:", self._key, current.size(), "bytes")
+
+        if self._previous is None:
+            return
+
+        for text in _diff(self._previous, current):
+            yield text
+
+    def abandon(self):
+        """
+        Yields the output held back for the diff without storing it, for
+        runs stopped before their output was complete
+        """
+        current = self._close()
+
+        if self._previous is None:
+            return
+
+        yield ":: Output not compared, the run was stopped ::\n"
+
+        for line in _iter_lines(current.blob):
+            yield line + "\n"
+
+    def _close(self):
+        if self._pending != "":
+            self._add_line(self._pending)
+            self._pending = ""
+
+        self._chunks.append(self._compressor.flush())
+        current = _StoredOutput(self._hashes, b"".join(self._chunks))
+        self._chunks = None
+
+        return current
+
+
+def _diff(previous, current):
+    matcher = SequenceMatcher(None, previous.hashes, current.hashes, autojunk=False)
+    opcodes = [opcode for opcode in matcher.get_opcodes() if opcode[0] != "equal"]
+
+    if len(opcodes) == 0:
+        yield ":: No changes since previous run ::\n"
+        return
+
+    added = sum(j2 - j1 for (_, _, _, j1, j2) in opcodes)
+    removed = sum(i2 - i1 for (_, i1, i2, _, _) in opcodes)
+
+    yield ":: Changes since previous run: +%s -%s lines ::\n" % (added, removed)
+
+    old_lines = _LineCursor(previous.blob)
+    new_lines = _LineCursor(current.blob)
+
+    for tag, i1, i2, j1, j2 in opcodes:
+        yield "@@ -%s,%s +%s,%s @@\n" % (i1 + 1, i2 - i1, j1 + 1, j2 - j1)
+
+        for line in old_lines.take(i1, i2):
+            yield "-" + line + "\n"
+
+        for line in new_lines.take(j1, j2):
+            yield "+" + line + "\n"
+
+
+class _LineCursor(object):
+    """Forward-only access to the lines of a compressed output"""
+
+    def __init__(self, blob):
+        self._lines = _iter_lines(blob)
+        self._position = 0
+
+    def take(self, start, end):
+        while self._position < start:
+            next(self._lines)
+            self._position += 1
+
+        while self._position < end:
+            self._position += 1
+            yield next(self._lines)
+
+
+def _iter_lines(blob):
+    decompressor = zlib.decompressobj()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+
+    for offset in range(0, len(blob), _chunk_size):
+        end = offset + _chunk_size
+        data = decompressor.decompress(blob[offset:end])
+        lines = (pending + decoder.decode(data)).split("\n")
+        pending = lines.pop()
+
+        for line in lines:
+            yield line
+
+    pending += decoder.decode(decompressor.flush(), final=True)
+
+    if pending != "":
+        yield pending
@@ -0,0 +1,87 @@
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import debug, settings
+
+_lock = threading.Lock()
+_resolved = dict()
+_resolved_path_env = None
+
+
+def resolve(executable, cwd=None):
+    """
+    Returns the absolute path for executable, looking it up on PATH only the
+    first time it is requested. Returns None if it can't be found.
+    """
+    global _resolved_path_env
+
+    if not executable:
+        return None
+
+    path_env = os.environ.get("PATH", os.defpath)
+    relative = os.path.dirname(executable) != "" and not os.path.isabs(executable)
+    key = (executable, cwd if relative else None)
+
+    with _lock:
+        if path_env != _resolved_path_env:
+            _resolved.clear()
+            _resolved_path_env = path_env
+
+        resolved = _resolved.get(key)
+
+    if resolved is not None:
+        return resolved
+
+    if relative and cwd is not None:
+        resolved = shutil.which(os.path.join(cwd, executable), path=path_env)
+    else:
+        resolved = shutil.which(executable, path=path_env)
+
+    debug.log("Resolved executable", executable, "=>", resolved)
+
+    if resolved is None:
+        return None
+
+    resolved = os.path.abspath(resolved)
+
+    with _lock:
+        _resolved[key] = resolved
+
+    return resolved
+
+
+def forget(executable=None):
+    with _lock:
+        if executable is None:
+            _resolved.clear()
+            return
+
+        for key in [key for key in _resolved if key[0] == executable]:
+            del _resolved[key]
+
+
+def validate_tools(tools, max_workers=8):
+    """
+    Resolves the executable of every Tool in parallel.
+    Returns a list of (tool name, executable, resolved path or None).
+    """
+
+    def validate(tool):
+        executable = tool.get_executable()
+
+        if tool.shell:
+            return (tool.name, executable, executable)
+
+        return (tool.name, executable, resolve(executable))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(validate, tools))
+
+
+def _on_plugin_loaded():
+    settings.register_on_change(forget)
+
+
+settings.register_on_plugin_loaded(_on_plugin_loaded)
@@ -0,0 +1,1164 @@
+import codecs
+import datetime
+import hashlib
+import mmap
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+from functools import partial
+from os import path
+from threading import Thread
+
+from . import (
+    debug,
+    diff,
+    executables,
+    filters,
+    history,
+    prewarm,
+    profiling,
+    settings,
+    workspace,
+)
+from .tool import Tool
+
+try:
+    import resource
+except ImportError:
+    # Windows, where resource limits are not applied
+    resource = None
+
+# Seconds between checks of limits while a process runs
+_poll_interval = 0.25
+
+# First check, the delay doubles up to _poll_interval so short runs are
+# sampled too
+_first_poll_interval = 0.01
+
+# Bytes of a tmpfile output decoded at a time, a multiple of the page size
+_read_window = 256 * 1024
+
+_line_re = re.compile(r"[^\n]*\n|[^\n]+")
+
+# Preview rows are lines with something other than blanks and table borders
+_row_re = re.compile(r"[^\s|+=-]")
+
+_peak_rss_re = re.compile(rb"^VmHWM:\s*(\d+) kB", re.MULTILINE)
+
+
+def _hidden_startupinfo():
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return startupinfo
+
+
+def _get_resource_limits(max_memory_mb, max_cpu_seconds):
+    limits = []
+
+    if max_memory_mb is not None:
+        max_memory = int(max_memory_mb * 1024 * 1024)
+        limits.append((resource.RLIMIT_AS, (max_memory, max_memory)))
+
+    if max_cpu_seconds is not None:
+        max_cpu = int(max_cpu_seconds)
+        limits.append((resource.RLIMIT_CPU, (max_cpu, max_cpu)))
+
+    return limits
+
+
+def _set_resource_limits(limits):
+    """
+    Runs in the child process before exec. The parent has threads, so it
+    only calls setrlimit: no imports, locks or allocations it can avoid.
+    """
+    for limit, values in limits:
+        resource.setrlimit(limit, values)
+
+
+def _split_batches(text, separator):
+    """
+    Splits a script after every line that only holds the separator, as
+    sqlcmd does with GO. Returns the line each batch starts at and its text,
+    skipping batches with nothing but the separator.
+    """
+    separator_re = re.compile(
+        r"^[ \t]*%s[ \t]*\r?$" % re.escape(separator), re.IGNORECASE | re.MULTILINE
+    )
+
+    batches = []
+    start = 0
+    ends = [match.end() for match in separator_re.finditer(text)] + [len(text)]
+
+    for end in ends:
+        batch = text[start:end]
+
+        if separator_re.sub("", batch).strip() != "":
+            # Counted from the first line with text, not the blank ones before
+            blank = len(batch) - len(batch.lstrip())
+            line = text.count("\n", 0, start + blank) + 1
+            batches.append((line, batch if batch.endswith("\n") else batch + "\n"))
+
+        start = end + 1
+
+    return batches
+
+
+def format_size(size):
+    if size < 1024:
+        return "%d B" % size
+
+    for unit in ("KB", "MB", "GB"):
+        size /= 1024.0
+        if size < 1024 or unit == "GB":
+            return "%.1f %s" % (size, unit)
+
+
+def _get_peak_rss(pid):
+    """
+    Largest peak resident memory of pid and of the processes it started,
+    from /proc. None without /proc or once pid has ended. The rusage of a
+    process counts the memory of the parent it was forked from, so it is
+    not used.
+    """
+    peak = None
+    pids = [pid]
+
+    while len(pids) > 0:
+        current = pids.pop()
+
+        try:
+            with open("/proc/%s/status" % current, "rb") as status_file:
+                match = _peak_rss_re.search(status_file.read())
+
+            if match is not None:
+                peak = max(peak or 0, int(match.group(1)) * 1024)
+
+            for task in os.listdir("/proc/%s/task" % current):
+                with open("/proc/%s/task/%s/children" % (current, task)) as children:
+                    pids.extend(int(child) for child in children.read().split())
+        except (OSError, ValueError):
+            continue
+
+    return peak
+
+
+def _exit_code(status):
+    """Return code of a wait status, as Popen.returncode has it"""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+
+    return os.WEXITSTATUS(status)
+
+
+class NoContext(object):
+    """Context manager that does nothing, in place of an optional one"""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class ResourceUsage(object):
+    """
+    CPU time, peak memory and block I/O of the tool processes of a run. The
+    peak memory is sampled while they run, it is unknown without /proc or
+    when they end before the first sample.
+    """
+
+    def __init__(self):
+        self.user_time = 0.0
+        self.system_time = 0.0
+        self.max_rss = None
+        self.blocks_in = 0
+        self.blocks_out = 0
+
+    def add(self, rusage, max_rss):
+        self.user_time += rusage.ru_utime
+        self.system_time += rusage.ru_stime
+        self.blocks_in += rusage.ru_inblock
+        self.blocks_out += rusage.ru_oublock
+
+        if max_rss is not None:
+            self.max_rss = max(self.max_rss or 0, max_rss)
+
+    def __str__(self):
+        return "cpu %.2fs user %.2fs sys, max rss %s, io %s/%s blocks" % (
+            self.user_time,
+            self.system_time,
+            "unknown" if self.max_rss is None else format_size(self.max_rss),
+            self.blocks_in,
+            self.blocks_out,
+        )
+
+
+class Execution(object):
+    """
+    Runs a tool and reads its output. It knows nothing about Sublime Text:
+    where the input comes from and where the output goes is decided by
+    subclasses, see Command for the plugin and cli for the command line.
+    """
+
+    def __init__(self, command_arguments):
+        self._command_arguments = command_arguments
+
+        self._running = False
+        self._cancelled = False
+
+        self._tool = None
+
+        self._desc = None
+        self._profile = None
+
+        self._process = None
+        self._limit_reached = None
+        self._preview_reached = None
+        self._output_bytes = 0
+        self._output_lines = 0
+        self._output_rows = 0
+
+        self._writer = None
+        self._status_time = None
+        self._status_bytes = 0
+
+        self._input_text = None
+        self._process_input = None
+        self._input_file = None
+        self._output_file = None
+        self._output_stream = None
+
+        self._profiler = None
+        self._filter = None
+
+        # Only known where os.wait4() is available
+        self._usage = None
+        self._batch_usage = None
+        self._peak_rss = None
+
+    # Subclasses decide where input comes from and where output goes
+
+    def _extract_input(self):
+        raise NotImplementedError()
+
+    def _create_working_directory(self):
+        raise NotImplementedError()
+
+    def _begin_write(self):
+        pass
+
+    def write(self, text):
+        raise NotImplementedError()
+
+    def _finish_output(self, timedelta):
+        pass
+
+    def _notify(self, msg):
+        debug.log("[%s]" % self._desc, msg)
+
+    def _set_status(self, msg):
+        pass
+
+    def _get_syntax_file(self):
+        return self._tool.results.syntax_file
+
+    def _cancel_previous(self):
+        """Called before a run starts, to stop any run it replaces"""
+        pass
+
+    def _follow_existing(self):
+        """Returns True when the run is served by an identical one in progress"""
+        return False
+
+    def _claim(self):
+        """Called once the process is running"""
+        pass
+
+    def _release(self):
+        """Called once the output has been written"""
+        pass
+
+    def _run_thread(self):
+        self._main_thread = Thread(target=self._begin_run)
+        self._main_thread.start()
+
+    def _prewarm(self):
+        self._create_working_directory()
+
+        if not self._resolve_executable():
+            return
+
+        tool = self._tool
+        command_array = tool.get_command_array()
+
+        if self._executable is not None:
+            command_array[0] = self._executable
+
+        if not prewarm.is_eligible(tool, command_array):
+            return
+
+        self._command_array = command_array
+
+        prewarm.park(self._get_prewarm_key(), self._spawn)
+
+    def _create_profile_tool(self, selected_group, selected_profile):
+        group_descriptor = settings.get_group(selected_group)
+        profile_descriptor = None
+
+        if group_descriptor is None:
+            self._notify("There is no group named: %s" % selected_group)
+            return None
+
+        for single_profile in group_descriptor["profiles"]:
+            if single_profile["name"] == selected_profile:
+                profile_descriptor = single_profile
+
+        if profile_descriptor is None:
+            self._notify("There is no profile named: %s" % selected_profile)
+            return None
+
+        debug.log("Running command for profile: ", profile_descriptor)
+
+        tool_id = profile_descriptor.get("tool", group_descriptor.get("tool"))
+
+        if self._create_tool(tool_id) is None:
+            self._notify("There is no tool named: %s" % tool_id)
+            return None
+
+        self._desc = "%s/%s" % (selected_group, selected_profile)
+        self._profile = self._desc
+
+        self._tool.set_command_arguments(
+            group_descriptor, profile_descriptor, self._command_arguments
+        )
+
+        return self._tool
+
+    def cancel(self, wait=False):
+        self._cancelled = True
+        self._terminate_process()
+        if wait:
+            self._main_thread.join()
+
+    def _create_tool(self, tool_id):
+        tool_config = settings.get_tool(tool_id)
+
+        if tool_config is None:
+            return None
+
+        self._tool = Tool(**tool_config)
+
+        return self._tool
+
+    def _create_temp_input_file(self):
+        input = self._tool.input
+        input_text = self._process_input
+
+        self._input_file = workspace.acquire("input", input.file_suffix or "")
+
+        with open(self._input_file, "wb") as tmpfile:
+            tmpfile.write(bytes(input_text, input.codec))
+
+        input_file = path.normpath(self._input_file)
+
+        if sys.platform == "win32":
+            # Fixing input file path in windows
+            input_file = input_file.replace("\\", "\\\\")
+
+        debug.log("Created input file:", input_file)
+
+        return input_file
+
+    def _create_temp_output_file(self):
+        self._output_file = workspace.acquire("output")
+
+        debug.log("Created output file:", self._output_file)
+
+        return self._output_file
+
+    def _phase(self, name):
+        """Context of a run phase, profiled when profile_runs is enabled"""
+        if self._profiler is None:
+            return NoContext()
+
+        return self._profiler.phase(name)
+
+    def _profiled(self, name, function):
+        if self._profiler is None:
+            return function
+
+        return self._profiler.wrap(name, function)
+
+    def _finish_profile(self):
+        if self._profiler is not None:
+            self._profiler.finish()
+            self._profiler = None
+
+    def _begin_run(self):
+        if settings.get_setting("profile_runs", False):
+            self._profiler = profiling.RunProfiler(self._desc)
+
+        try:
+            self._start_run()
+        finally:
+            # Without a process there is no monitor thread to finish it
+            if self._process is None:
+                self._finish_profile()
+
+    def _start_run(self):
+        tool = self._tool
+
+        with self._phase("extract_input"):
+            self._extract_input()
+
+        input_text = self._input_text
+
+        if input_text == "" and not tool.input.allow_empty:
+            self._notify("This tool does not allow empty input")
+            return
+
+        # Scripts split in batches run them one process at a time
+        self._batches = None
+        self._process_input = input_text
+
+        if tool.batches.separator is not None:
+            batches = _split_batches(input_text, tool.batches.separator)
+            if len(batches) > 1:
+                self._batches = batches
+                self._batch_index = 0
+                self._process_input = batches[0][1]
+
+        if tool.filters.is_enabled():
+            try:
+                self._filter = filters.OutputFilter(tool.filters)
+            except re.error as e:
+                self._notify("Invalid output filter: %s" % e)
+                return
+
+        self._create_working_directory()
+        debug.log("Using Working Directory:", self._working_directory)
+
+        if not self._resolve_executable():
+            self._notify("Executable not found: %s" % tool.get_executable())
+            return
+
+        if self._follow_existing():
+            return
+
+        with self._phase("command_line"):
+            self._create_command_line()
+        debug.log("Using Command Line:", self._command_array)
+
+        if tool.output.mode != "none":
+            self._cancel_previous()
+
+        self._execution_cancelled = False
+
+        self._differ = None
+        if tool.results.diff:
+            self._differ = diff.OutputDiffer(
+                diff.run_key(
+                    tool.name,
+                    tool.get_command_array(),
+                    self._working_directory,
+                    self._input_text,
+                )
+            )
+
+        self._recorder = None
+        if tool.output.mode != "none" and history.is_enabled():
+            self._recorder = history.Recorder(
+                settings.get_setting("history_max_output_bytes", 10 * 1024 * 1024)
+            )
+
+        self.starttime = datetime.datetime.now()
+
+        self._notify("Running...")
+
+        try:
+            with self._phase("start_process"):
+                self._run_process()
+        finally:
+            if self._process is None:
+                self._clean()
+
+        if self._process is None:
+            self._notify("Executable not found")
+            return
+
+        if tool.output.mode != "none":
+            self._claim()
+
+        with self._phase("begin_write"):
+            self._begin_write()
+        self._running = True
+
+        if self._batches is not None:
+            self._begin_batch()
+
+        self._thread = Thread(target=self._command_monitor_worker)
+        self._thread.start()
+
+    def _command_monitor_worker(self):
+        """
+        This must be called in it's own thread as it will block while
+        the process is running, and while the process is reading the
+        output
+        """
+        try:
+            self._wait_for_process()
+
+            while self._batches is not None and self._next_batch():
+                self._wait_for_process()
+
+            with self._phase("end_run"):
+                self._end_run()
+        finally:
+            self._clean()
+            self._finish_profile()
+
+    def _wait_for_process(self):
+        tool = self._tool
+
+        self._read_thread = None
+
+        if tool.output.mode == "pipe":
+            self._read_thread = Thread(target=self._profiled("read", self._read_output))
+            self._read_thread.start()
+
+        self._peak_rss = None
+
+        reaper = None
+        if hasattr(os, "wait4"):
+            reaper = Thread(target=self._reap_process)
+            reaper.start()
+
+        interval = _first_poll_interval
+
+        while not self._has_ended(reaper, interval):
+            if reaper is not None:
+                self._sample_memory()
+
+            self._check_limits()
+            self._update_status()
+
+            interval = min(interval * 2, _poll_interval)
+
+        self._lock = True
+
+        if self._read_thread is not None:
+            self._read_thread.join()
+
+    def _has_ended(self, reaper, timeout):
+        if reaper is None:
+            try:
+                self._process.wait(timeout=timeout)
+                return True
+            except subprocess.TimeoutExpired:
+                return False
+
+        reaper.join(timeout)
+        return not reaper.is_alive()
+
+    def _sample_memory(self):
+        process = self._process
+
+        # Once reaped its pid may belong to another process
+        if process.returncode is not None:
+            return
+
+        peak_rss = _get_peak_rss(process.pid)
+
+        if peak_rss is not None:
+            self._peak_rss = max(self._peak_rss or 0, peak_rss)
+
+    def _reap_process(self):
+        """Waits for the tool with os.wait4(), to know the resources it used"""
+        process = self._process
+
+        try:
+            _, status, rusage = os.wait4(process.pid, 0)
+        except ChildProcessError:
+            # Popen.poll() reaped it first and has set its returncode
+            process.wait()
+            return
+
+        process.returncode = _exit_code(status)
+
+        self._batch_usage = ResourceUsage()
+        self._batch_usage.add(rusage, self._peak_rss)
+
+        if self._usage is None:
+            self._usage = ResourceUsage()
+        self._usage.add(rusage, self._peak_rss)
+
+    def _begin_batch(self):
+        line, text = self._batches[self._batch_index]
+
+        self._batch_starttime = datetime.datetime.now()
+        self._write_banner(
+            "\n:: Batch %s of %s, line %s ::\n"
+            % (self._batch_index + 1, len(self._batches), line)
+        )
+
+        # The next batch can adopt a process started while this one runs
+        if self._batch_index + 1 < len(self._batches) and prewarm.is_eligible(
+            self._tool, self._command_array
+        ):
+            prewarm.park(self._get_prewarm_key(), self._spawn)
+
+    def _next_batch(self):
+        """Reports the batch that ended and starts the next one, if any"""
+        batches = self._batches
+        index = self._batch_index
+        returncode = self._process.returncode
+        timedelta = datetime.datetime.now() - self._batch_starttime
+
+        with self._phase("read"):
+            self._write_output()
+        self._flush_filter()
+        self._clean()
+
+        usage = ""
+        if self._batch_usage is not None:
+            usage = ", %s" % self._batch_usage
+            self._batch_usage = None
+
+        self._write_banner(
+            ":: Batch %s of %s: exit code %s in %s seconds%s ::\n"
+            % (index + 1, len(batches), returncode, timedelta.total_seconds(), usage)
+        )
+
+        if index + 1 >= len(batches):
+            return False
+
+        if (
+            self._cancelled
+            or self._limit_reached is not None
+            or self._preview_reached is not None
+        ):
+            self._evict_next_batch()
+            return False
+
+        if returncode != 0 and self._tool.batches.stop_on_error:
+            self._write_banner(
+                ":: Stopped at failed batch %s, %s batches not run ::\n"
+                % (index + 1, len(batches) - index - 1)
+            )
+            self._evict_next_batch()
+            return False
+
+        previous_process = self._process
+
+        self._batch_index = index + 1
+        self._process_input = batches[self._batch_index][1]
+        self._create_command_line()
+
+        try:
+            self._run_process()
+        finally:
+            if self._process is previous_process:
+                self._clean()
+
+        if self._process is previous_process:
+            self._write_banner(":: Unable to start batch %s ::\n" % (index + 2))
+            self._evict_next_batch()
+            return False
+
+        self._begin_batch()
+
+        return True
+
+    def _evict_next_batch(self):
+        """Stops the process _begin_batch() parked for a batch not run"""
+        if prewarm.is_eligible(self._tool, self._command_array):
+            prewarm.evict(self._get_prewarm_key())
+
+    def _write_banner(self, text):
+        """Writes text of ToolRunner itself, in order with the tool output"""
+        if self._writer is not None:
+            self._writer.put(text)
+        else:
+            self.write(text)
+
+    def _read_output(self):
+        tool = self._tool
+        stdout = self._process.stdout
+
+        while not self._cancelled:
+            outbytes = stdout.readline()
+            if outbytes == b"":
+                break
+
+            text = outbytes.decode(tool.output.codec, "replace").replace("\r", "")
+
+            if not self._count_output(len(outbytes), text=text):
+                break
+
+            self._write_result(text)
+
+    def _count_output(self, size, lines=1, text=None):
+        """
+        Accounts for output read, returns False once a limit or the preview
+        size is reached. text is only needed to count preview rows.
+        """
+        limits = self._tool.limits
+        preview = self._tool.preview
+
+        self._output_bytes += size
+        self._output_lines += lines
+
+        if preview.rows is not None and text is not None and _row_re.search(text):
+            self._output_rows += 1
+
+        if preview.lines is not None and self._output_lines > preview.lines:
+            self._stop_for_preview("%s lines" % preview.lines)
+
+        elif preview.bytes is not None and self._output_bytes > preview.bytes:
+            self._stop_for_preview("%s bytes" % preview.bytes)
+
+        elif preview.rows is not None and self._output_rows > preview.rows:
+            self._stop_for_preview("%s rows" % preview.rows)
+
+        if (
+            limits.max_output_bytes is not None
+            and self._output_bytes > limits.max_output_bytes
+        ):
+            self._stop_for_limit("output of %s bytes" % limits.max_output_bytes)
+
+        elif (
+            limits.max_output_lines is not None
+            and self._output_lines > limits.max_output_lines
+        ):
+            self._stop_for_limit("output of %s lines" % limits.max_output_lines)
+
+        return self._limit_reached is None and self._preview_reached is None
+
+    def _check_limits(self):
+        limits = self._tool.limits
+
+        if limits.timeout is not None:
+            elapsed = datetime.datetime.now() - self.starttime
+            if elapsed.total_seconds() > limits.timeout:
+                self._stop_for_limit("timeout of %s seconds" % limits.timeout)
+
+        if self._tool.output.mode == "tmpfile-pipe" and self._output_file:
+            try:
+                size = os.path.getsize(self._output_file)
+            except OSError:
+                return
+
+            if limits.max_output_bytes is not None and size > limits.max_output_bytes:
+                self._stop_for_limit("output of %s bytes" % limits.max_output_bytes)
+
+            preview = self._tool.preview
+            if preview.bytes is not None and size > preview.bytes:
+                self._stop_for_preview("%s bytes" % preview.bytes)
+
+    def _update_status(self):
+        if self._tool.output.mode == "none":
+            return
+
+        now = time.time()
+        elapsed = now - self.starttime.timestamp()
+
+        rate = 0
+        if self._status_time is not None and now > self._status_time:
+            rate = (self._output_bytes - self._status_bytes) / (now - self._status_time)
+
+        self._status_time = now
+        self._status_bytes = self._output_bytes
+
+        self._set_status(
+            "Running %.1fs, %s, %s lines, %s/s, queue %s"
+            % (
+                elapsed,
+                format_size(self._output_bytes),
+                self._output_lines,
+                format_size(rate),
+                self._writer.depth() if self._writer is not None else 0,
+            )
+        )
+
+    def _stop_for_limit(self, limit):
+        if self._limit_reached is not None:
+            return
+
+        debug.warning("Limit reached:", limit, self._command_array)
+
+        self._limit_reached = limit
+
+        self._terminate_process(kill=True)
+
+    def _stop_for_preview(self, size):
+        if self._preview_reached is not None:
+            return
+
+        debug.log("Preview complete:", size, self._command_array)
+
+        self._preview_reached = size
+
+        # Nothing else will be shown, so the tool doesn't need to go on
+        self._terminate_process(kill=True)
+
+    def _terminate_process(self, kill=False):
+        """Stops the tool and every process it started"""
+        process = self._process
+
+        if process is None:
+            return
+
+        try:
+            if os.name == "posix":
+                os.killpg(process.pid, signal.SIGKILL if kill else signal.SIGTERM)
+            elif process.poll() is None:
+                subprocess.call(
+                    ["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                    startupinfo=_hidden_startupinfo(),
+                )
+        except OSError as e:
+            debug.log("Unable to stop process group", process.pid, e)
+            if process.poll() is None and kill:
+                process.kill()
+            elif process.poll() is None:
+                process.terminate()
+
+    def _end_run(self):
+        tool = self._tool
+
+        self._log_metrics()
+
+        if tool.output.mode == "none":
+            return
+
+        self.endtime = datetime.datetime.now()
+        timedelta = self.endtime - self.starttime
+
+        with self._phase("read"):
+            self._write_output()
+        self._flush_filter()
+
+        if self._writer is not None:
+            self._writer.close()
+
+        if self._differ is not None and not self._cancelled:
+            # Output cut short by a limit or the preview is no baseline
+            if self._limit_reached is None and self._preview_reached is None:
+                texts = self._differ.finish()
+            else:
+                texts = self._differ.abandon()
+
+            for text in texts:
+                self.write(text)
+
+        if self._cancelled:
+            self.write("\n:: Execution cancelled ::\n")
+
+        if self._limit_reached is not None:
+            self.write(
+                "\n:: Execution stopped: limit reached (%s) ::\n" % self._limit_reached
+            )
+
+        if self._filter is not None and self._filter.discarded > 0:
+            self.write("\n:: %s lines filtered out ::\n" % self._filter.discarded)
+
+        if self._preview_reached is not None:
+            self.write(
+                "\n:: Preview of the first %s, "
+                'use "ToolRunner: Run Again in Full" to see everything ::\n'
+                % self._preview_reached
+            )
+
+        self._finish_output(timedelta)
+
+        self._release()
+
+        if self._recorder is not None:
+            self._record_history(timedelta)
+
+    def _log_metrics(self):
+        timedelta = datetime.datetime.now() - self.starttime
+
+        debug.info(
+            "Run metrics for %s:" % self._desc,
+            "exit code %s," % self._process.returncode,
+            "%.3fs wall," % timedelta.total_seconds(),
+            "%s," % ("no usage" if self._usage is None else self._usage),
+            "output %s in %s lines"
+            % (format_size(self._output_bytes), self._output_lines),
+        )
+
+    def _record_history(self, timedelta):
+        tool = self._tool
+
+        history.record(
+            started_at=self.starttime.timestamp(),
+            duration=timedelta.total_seconds(),
+            tool=tool.name,
+            profile=self._profile,
+            arguments=history.mask_arguments(tool, tool.get_command_array()),
+            input_hash=hashlib.sha1(self._input_text.encode("utf-8")).hexdigest(),
+            exit_code=self._process.returncode,
+            syntax_file=self._get_syntax_file(),
+            recorder=self._recorder,
+        )
+
+    def _write_result(self, text):
+        if self._filter is not None:
+            text = self._filter.feed(text)
+            if text is None:
+                return
+
+        self._show_result(text)
+
+    def _flush_filter(self):
+        """Shows the lines the filter held back for the tail"""
+        if self._filter is not None:
+            text = self._filter.flush()
+            if text != "":
+                self._show_result(text)
+
+    def _show_result(self, text):
+        if self._recorder is not None:
+            self._recorder.feed(text)
+
+        if self._differ is not None:
+            self._differ.feed(text)
+            if self._differ.has_previous():
+                return
+
+        if self._writer is not None:
+            self._writer.put(text)
+        else:
+            self.write(text)
+
+    def _resolve_executable(self):
+        tool = self._tool
+
+        self._executable = None
+
+        if tool.shell:
+            return True
+
+        self._executable = executables.resolve(
+            tool.get_executable(), self._working_directory
+        )
+
+        return self._executable is not None
+
+    def _create_command_line(self):
+        tool = self._tool
+
+        command_array = tool.get_command_array()
+
+        if self._executable is not None:
+            command_array[0] = self._executable
+
+        debug.log("Command array: ", command_array)
+
+        for i in range(len(command_array)):
+            input_re = re.escape(r"$[toolrunner_input_file]")
+            if re.search(input_re, command_array[i]):
+                if tool.input.mode == "tmpfile-path":
+                    command_array[i] = re.sub(
+                        input_re, self._create_temp_input_file(), command_array[i]
+                    )
+
+            if command_array[i] == "$[toolrunner_input_text]":
+                if tool.input.mode == "cmdline":
+                    command_array[i] = self._process_input
+
+            if command_array[i] == "$[toolrunner_output_file]":
+                if tool.output.mode == "tmpfile-path":
+                    command_array[i] = self._create_temp_output_file()
+
+        self._command_array = command_array
+
+    def _get_prewarm_key(self):
+        limits = self._tool.limits
+
+        return (
+            tuple(self._command_array),
+            self._working_directory,
+            self._tool.shell,
+            limits.max_memory_mb,
+            limits.max_cpu_seconds,
+        )
+
+    def _spawn(self, stdout=None):
+        tool = self._tool
+
+        startupinfo = None
+        stdin = None
+        stderr = None
+
+        if os.name == "nt":
+            if tool.output.mode != "none":
+                startupinfo = subprocess.STARTUPINFO()
+                startupinfo.dwFlags |= subprocess.CREATE_NEW_CONSOLE
+                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+        if tool.output.mode != "none":
+            stdin = subprocess.PIPE
+
+        if tool.output.mode == "tmpfile-pipe":
+            stderr = subprocess.STDOUT
+        elif tool.output.mode == "none":
+            pass
+        else:
+            stdout = subprocess.PIPE
+            stderr = subprocess.STDOUT
+
+        preexec_fn = None
+        creationflags = 0
+
+        if os.name == "posix":
+            start_new_session = True
+        else:
+            start_new_session = False
+            creationflags = subprocess.CREATE_NEW_PROCESS_GROUP
+
+        if tool.limits.has_resource_limits() and resource is not None:
+            preexec_fn = partial(
+                _set_resource_limits,
+                _get_resource_limits(
+                    tool.limits.max_memory_mb, tool.limits.max_cpu_seconds
+                ),
+            )
+
+        return subprocess.Popen(
+            self._command_array,
+            stdin=stdin,
+            stdout=stdout,
+            stderr=stderr,
+            shell=tool.shell,
+            startupinfo=startupinfo,
+            cwd=self._working_directory,
+            preexec_fn=preexec_fn,
+            start_new_session=start_new_session,
+            creationflags=creationflags,
+        )
+
+    def _run_process(self):
+        tool = self._tool
+
+        process = None
+        stdout = None
+
+        if tool.output.mode == "tmpfile-pipe":
+            self._create_temp_output_file()
+            stdout = self._output_stream = open(self._output_file, "wb+")
+
+        if prewarm.is_eligible(tool, self._command_array):
+            process = prewarm.adopt(self._get_prewarm_key())
+
+        if process is None:
+            try:
+                process = self._spawn(stdout)
+
+            except FileNotFoundError as e:
+                debug.error("Error:", e)
+                executables.forget(tool.get_executable())
+                return
+
+        self._stdout = stdout if process.stdout is None else process.stdout
+
+        if tool.input.mode == "pipe":
+            process.stdin.write(self._process_input.encode(tool.input.codec, "replace"))
+
+        if process.stdin is not None:
+            process.stdin.close()
+
+        self._process = process
+
+    def _write_output(self):
+        if not self._output_file:
+            return
+
+        # Bounded windows of the mapped file, never the whole text at once
+        decoder = codecs.getincrementaldecoder(self._tool.output.codec)("replace")
+        pending = ""
+        split_lines = self._splits_lines()
+
+        with open(self._output_file, "rb") as tmpfile:
+            size = os.fstat(tmpfile.fileno()).st_size
+
+            if size == 0:
+                return
+
+            with mmap.mmap(tmpfile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for offset in range(0, size, _read_window):
+                    end = offset + _read_window
+                    text = pending + decoder.decode(data[offset:end])
+
+                    # Drop the pages already decoded from the process memory
+                    if hasattr(mmap, "MADV_DONTNEED"):
+                        data.madvise(
+                            mmap.MADV_DONTNEED, offset, min(end, size) - offset
+                        )
+
+                    # A \r\n pair can be split between two windows, and so can
+                    # a line when lines are handled one by one
+                    cut = len(text)
+                    if split_lines:
+                        cut = text.rfind("\n") + 1
+                    elif text.endswith("\r"):
+                        cut -= 1
+
+                    pending = text[cut:]
+                    text = text[:cut]
+
+                    if not self._write_output_text(text):
+                        return
+
+        self._write_output_text(pending + decoder.decode(b"", final=True))
+
+    def _write_output_text(self, text):
+        if text == "":
+            return True
+
+        text = text.replace("\r\n", "\n")
+
+        if not self._splits_lines():
+            self._count_output(len(text), text.count("\n"))
+            self._write_result(text)
+            return True
+
+        for line in _line_re.findall(text):
+            if not self._count_output(len(line), text=line):
+                return False
+            self._write_result(line)
+
+        return True
+
+    def _splits_lines(self):
+        """
+        Output files are only split in lines when a limit may stop the
+        output half way, or for the filter to see each line
+        """
+        limits = self._tool.limits
+
+        return (
+            limits.max_output_bytes is not None
+            or limits.max_output_lines is not None
+            or self._tool.preview.is_enabled()
+            or self._filter is not None
+        )
+
+    def _clean(self):
+        if self._output_stream is not None:
+            self._output_stream.close()
+            self._output_stream = None
+
+        if self._input_file:
+            debug.log("Releasing:", self._input_file)
+            workspace.release(self._input_file)
+            self._input_file = None
+
+        if self._output_file:
+            debug.log("Releasing:", self._output_file)
+            workspace.release(self._output_file)
+            self._output_file = None
@@ -0,0 +1,226 @@
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Thread
+
+from . import debug, manager, settings
+from .command import Command
+
+
+class FanOutCommand(Command):
+    """
+    Runs the same input on several profiles of a group at once, writing
+    each profile's output as a labelled section of a single target view.
+    """
+
+    def __init__(self, source_window, command_arguments, source_view=None):
+        Command.__init__(self, source_window, command_arguments, source_view)
+        self._group = None
+        self._profile_names = None
+        self._runs_lock = threading.Lock()
+        self._runs = []
+
+    def run_group(self, selected_group, selected_profiles=None):
+        group_descriptor = settings.get_group(selected_group)
+
+        if group_descriptor is None:
+            self._notify("There is no group named: %s" % selected_group)
+            return
+
+        profile_names = [profile["name"] for profile in group_descriptor["profiles"]]
+
+        if selected_profiles is not None:
+            profile_names = [
+                name for name in profile_names if name in selected_profiles
+            ]
+
+        if len(profile_names) <= 0:
+            self._notify("There are no profiles to run in %s" % selected_group)
+            return
+
+        # The first profile decides how input is extracted and results shown
+        if not self._create_profile_tool(selected_group, profile_names[0]):
+            return
+
+        self._group = selected_group
+        self._profile_names = profile_names
+        self._desc = "%s (%s profiles)" % (selected_group, len(profile_names))
+
+        self._main_thread = Thread(target=self._fan_out)
+        self._main_thread.start()
+
+    def cancel(self, wait=False):
+        self._cancelled = True
+
+        with self._runs_lock:
+            runs = list(self._runs)
+
+        for run in runs:
+            run.cancel()
+
+        if wait:
+            self._main_thread.join()
+
+    def _fan_out(self):
+        tool = self._tool
+
+        self._extract_input()
+
+        if self._input_text == "" and not tool.input.allow_empty:
+            self._notify("This tool does not allow empty input")
+            return
+
+        manager.cancel_command_for_source_view(self._source_view, True)
+        manager.set_current_command_for_source_view(self._source_view, self)
+
+        self.starttime = datetime.datetime.now()
+        self._notify("Running...")
+
+        self._begin_write()
+
+        try:
+            results = self._run_profiles()
+        finally:
+            # Sections are written directly, the writer is never fed
+            if self._writer is not None:
+                self._writer.close()
+
+        self.endtime = datetime.datetime.now()
+        timedelta = self.endtime - self.starttime
+
+        self._write_summary(results)
+
+        if self._cancelled:
+            self.write("\n:: Execution cancelled ::\n")
+
+        self._finish_output(timedelta)
+
+        manager.clear_current_command_for_source_view(self._source_view, self)
+
+    def _run_profiles(self):
+        max_workers = settings.get_setting("fanout_max_workers", 8)
+        results = []
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._run_profile, profile_name)
+                for profile_name in self._profile_names
+            ]
+
+            for future in as_completed(futures):
+                run = future.result()
+                results.append(run)
+                self._write_section(run)
+                self._notify(
+                    "%s of %s profiles done" % (len(results), len(self._profile_names))
+                )
+
+        return results
+
+    def _run_profile(self, profile_name):
+        run = _ProfileRun(self)
+        run.profile_name = profile_name
+
+        if self._cancelled:
+            run.message = "Cancelled"
+            return run
+
+        with self._runs_lock:
+            self._runs.append(run)
+
+        try:
+            run.run_profile_and_wait(self._group, profile_name)
+        except Exception as e:
+            debug.error("Error running profile", profile_name, e)
+            run.message = "Error: %s" % e
+        finally:
+            with self._runs_lock:
+                self._runs.remove(run)
+
+        return run
+
+    def _write_section(self, run):
+        self.write("\n:: %s ::\n" % run.get_summary())
+        self.write("".join(run.chunks))
+
+    def _write_summary(self, runs):
+        runs = sorted(runs, key=lambda run: self._profile_names.index(run.profile_name))
+        failed = [run for run in runs if not run.succeeded()]
+
+        self.write(
+            "\n:: Summary: %s profiles, %s failed ::\n" % (len(runs), len(failed))
+        )
+
+        for run in runs:
+            self.write(":: %s ::\n" % run.get_summary())
+
+
+class _ProfileRun(Command):
+    """Runs a single profile for a FanOutCommand, keeping its output"""
+
+    def __init__(self, fan_out):
+        Command.__init__(
+            self,
+            fan_out._source_window,
+            fan_out._command_arguments,
+            source_view=fan_out._source_view,
+        )
+        self._exclusive = False
+        self._preset_input_text = fan_out._input_text
+
+        self.profile_name = None
+        self.chunks = []
+        self.message = None
+        self.duration = None
+
+    def run_profile_and_wait(self, selected_group, selected_profile):
+        if not self._create_profile_tool(selected_group, selected_profile):
+            return
+
+        self._begin_run()
+
+        monitor_thread = getattr(self, "_thread", None)
+        if monitor_thread is not None:
+            monitor_thread.join()
+
+    def succeeded(self):
+        return (
+            self._process is not None
+            and self._process.returncode == 0
+            and not self._cancelled
+        )
+
+    def get_summary(self):
+        if self._process is None:
+            return "%s: %s" % (self.profile_name, self.message)
+
+        if self._cancelled:
+            status = "cancelled"
+        else:
+            status = "exit code %s" % self._process.returncode
+
+        if self.duration is None:
+            return "%s: %s" % (self.profile_name, status)
+
+        return "%s: %s in %s seconds" % (
+            self.profile_name,
+            status,
+            self.duration.total_seconds(),
+        )
+
+    def _extract_input(self):
+        self._input_text = self._preset_input_text
+        return self._input_text
+
+    def _begin_write(self):
+        pass
+
+    def write(self, text):
+        self.chunks.append(text)
+
+    def _notify(self, msg):
+        debug.log("[%s]" % self._desc, msg)
+        self.message = msg
+
+    def _finish_output(self, timedelta):
+        self.duration = timedelta
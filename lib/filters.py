@@ -0,0 +1,70 @@
+import re
+from collections import deque
+
+
+def _compile(patterns):
+    if patterns is None:
+        return None
+
+    if isinstance(patterns, str):
+        patterns = [patterns]
+
+    if len(patterns) == 0:
+        return None
+
+    return re.compile("|".join("(?:%s)" % pattern for pattern in patterns))
+
+
+class OutputFilter(object):
+    """
+    Decides which lines of the output of a run are shown, in the reader
+    thread. Lines are dropped by the include and exclude patterns, then
+    repeated lines are collapsed and, with tail, only the last ones kept.
+    Raises re.error when a pattern is invalid.
+    """
+
+    def __init__(self, filters):
+        self._include = _compile(filters.include)
+        self._exclude = _compile(filters.exclude)
+        self._dedupe = filters.dedupe
+        self._tail = None if filters.tail is None else deque(maxlen=filters.tail)
+
+        self._previous = None
+        self.discarded = 0
+
+    def feed(self, line):
+        """Returns the line if it is to be shown now, else None"""
+        if self._include is not None and self._include.search(line) is None:
+            self.discarded += 1
+            return None
+
+        if self._exclude is not None and self._exclude.search(line) is not None:
+            self.discarded += 1
+            return None
+
+        if self._dedupe:
+            if line == self._previous:
+                self.discarded += 1
+                return None
+            self._previous = line
+
+        if self._tail is not None:
+            # The oldest line leaves the tail as this one comes in
+            if len(self._tail) == self._tail.maxlen:
+                self.discarded += 1
+            self._tail.append(line)
+            return None
+
+        return line
+
+    def flush(self):
+        """Returns the lines held for the tail and starts a new one"""
+        self._previous = None
+
+        if self._tail is None or len(self._tail) == 0:
+            return ""
+
+        text = "".join(self._tail)
+        self._tail.clear()
+
+        return text
@@ -0,0 +1,315 @@
+import json
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from . import debug
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+_lock = threading.Lock()
+
+_path = None
+_max_bytes = 100 * 1024 * 1024
+_max_age_days = 30
+_fts = None
+
+_sensitive_params = ("pass", "secret", "token", "pwd")
+
+_schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    duration REAL,
+    tool TEXT NOT NULL,
+    profile TEXT,
+    arguments TEXT,
+    input_hash TEXT,
+    exit_code INTEGER,
+    syntax_file TEXT,
+    output_size INTEGER NOT NULL,
+    output BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_started_at ON runs (started_at);
+CREATE INDEX IF NOT EXISTS runs_tool ON runs (tool, started_at);
+CREATE INDEX IF NOT EXISTS runs_profile ON runs (profile, started_at);
+"""
+
+_run_columns = (
+    "id, started_at, duration, tool, profile, arguments, exit_code, syntax_file"
+)
+
+_fts_schema = """
+CREATE VIRTUAL TABLE IF NOT EXISTS runs_fts USING fts5 (output, content='');
+"""
+
+
+class Run(object):
+    def __init__(self, row):
+        (
+            self.id,
+            self.started_at,
+            self.duration,
+            self.tool,
+            self.profile,
+            self.arguments,
+            self.exit_code,
+            self.syntax_file,
+        ) = row
+
+    def get_output(self):
+        with _transaction() as connection:
+            row = connection.execute(
+                "SELECT output FROM runs WHERE id = ?", (self.id,)
+            ).fetchone()
+
+        return "" if row is None else zlib.decompress(row[0]).decode("utf-8")
+
+
+class Recorder(object):
+    """Compresses the output of a run as it is produced"""
+
+    def __init__(self, max_output_bytes):
+        self._compressor = zlib.compressobj()
+        self._chunks = []
+        self._size = 0
+        self._max_output_bytes = max_output_bytes
+        self.truncated = False
+
+    def feed(self, text):
+        if self.truncated:
+            return
+
+        data = text.encode("utf-8", "replace")
+
+        if self._size + len(data) > self._max_output_bytes:
+            self.truncated = True
+            data = b"\n:: Output truncated in history ::\n"
+
+        self._size += len(data)
+        self._chunks.append(self._compressor.compress(data))
+
+    def finish(self):
+        self._chunks.append(self._compressor.flush())
+        blob = b"".join(self._chunks)
+        self._chunks = None
+        return blob
+
+
+def is_enabled():
+    return sqlite3 is not None and _path is not None
+
+
+def configure(path=None, max_bytes=None, max_age_days=None):
+    global _path, _max_bytes, _max_age_days, _fts
+
+    if sqlite3 is None:
+        debug.log("sqlite3 is not available, history disabled")
+        return
+
+    if path != _path:
+        _fts = None
+
+    _path = path
+
+    if max_bytes is not None:
+        _max_bytes = max_bytes
+
+    if max_age_days is not None:
+        _max_age_days = max_age_days
+
+
+@contextmanager
+def _transaction():
+    with _lock:
+        os.makedirs(os.path.dirname(_path), exist_ok=True)
+        connection = sqlite3.connect(_path, timeout=5)
+        try:
+            _ensure_schema(connection)
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+
+def _ensure_schema(connection):
+    global _fts
+
+    if _fts is not None:
+        return
+
+    connection.executescript(_schema)
+
+    try:
+        connection.executescript(_fts_schema)
+        _fts = True
+    except sqlite3.OperationalError as e:
+        debug.warning("Full-text search not available for history:", e)
+        _fts = False
+
+
+def mask_arguments(tool, command_array):
+    """Hides the values of parameters that look like credentials"""
+    hidden = set()
+
+    for key, value in (tool.params_values or {}).items():
+        if isinstance(value, str) and any(
+            word in key.lower() for word in _sensitive_params
+        ):
+            hidden.add(value)
+
+    return ["****" if argument in hidden else argument for argument in command_array]
+
+
+def record(
+    started_at,
+    duration,
+    tool,
+    profile,
+    arguments,
+    input_hash,
+    exit_code,
+    syntax_file,
+    recorder,
+):
+    if not is_enabled():
+        return
+
+    blob = recorder.finish()
+
+    try:
+        with _transaction() as connection:
+            cursor = connection.execute(
+                "INSERT INTO runs (started_at, duration, tool, profile, arguments,"
+                " input_hash, exit_code, syntax_file, output_size, output)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    started_at,
+                    duration,
+                    tool,
+                    profile,
+                    json.dumps(arguments),
+                    input_hash,
+                    exit_code,
+                    syntax_file,
+                    len(blob),
+                    blob,
+                ),
+            )
+
+            if _fts:
+                connection.execute(
+                    "INSERT INTO runs_fts (rowid, output) VALUES (?, ?)",
+                    (cursor.lastrowid, zlib.decompress(blob).decode("utf-8")),
+                )
+
+            _prune(connection)
+    except sqlite3.Error as e:
+        debug.error("Unable to record run in history:", e)
+
+
+def _prune(connection):
+    expired = connection.execute(
+        "SELECT id FROM runs WHERE started_at < ?",
+        (time.time() - _max_age_days * 24 * 3600,),
+    ).fetchall()
+
+    total = connection.execute(
+        "SELECT COALESCE(SUM(output_size), 0) FROM runs"
+    ).fetchone()[0]
+
+    if total > _max_bytes:
+        oldest = connection.execute(
+            "SELECT id, output_size FROM runs ORDER BY started_at"
+        )
+        for run_id, output_size in oldest:
+            if total <= _max_bytes:
+                break
+            expired.append((run_id,))
+            total -= output_size
+
+    for (run_id,) in set(expired):
+        _delete(connection, run_id)
+
+    if len(expired) > 0:
+        debug.log("Pruned", len(expired), "runs from history")
+
+
+def _delete(connection, run_id):
+    if _fts:
+        row = connection.execute(
+            "SELECT output FROM runs WHERE id = ?", (run_id,)
+        ).fetchone()
+        # Contentless FTS tables need the original text to delete a row
+        connection.execute(
+            "INSERT INTO runs_fts (runs_fts, rowid, output) VALUES ('delete', ?, ?)",
+            (run_id, zlib.decompress(row[0]).decode("utf-8")),
+        )
+
+    connection.execute("DELETE FROM runs WHERE id = ?", (run_id,))
+
+
+def find(tool=None, profile=None, since=None, text=None, limit=500):
+    """Returns the most recent runs matching all the given filters"""
+    if not is_enabled():
+        return []
+
+    conditions = []
+    values = []
+
+    if tool is not None:
+        conditions.append("tool = ?")
+        values.append(tool)
+
+    if profile is not None:
+        conditions.append("profile = ?")
+        values.append(profile)
+
+    if since is not None:
+        conditions.append("started_at >= ?")
+        values.append(since)
+
+    try:
+        with _transaction() as connection:
+            if text is not None and _fts:
+                conditions.append(
+                    "id IN (SELECT rowid FROM runs_fts WHERE runs_fts MATCH ?)"
+                )
+                values.append('"%s"' % text.replace('"', '""'))
+
+            query = "SELECT %s FROM runs" % _run_columns
+            if len(conditions) > 0:
+                query += " WHERE " + " AND ".join(conditions)
+            query += " ORDER BY started_at DESC"
+
+            if text is not None and not _fts:
+                rows = _scan_outputs(connection, query, values, text, limit)
+            else:
+                rows = connection.execute(query + " LIMIT ?", values + [limit])
+                rows = rows.fetchall()
+    except sqlite3.Error as e:
+        debug.error("Unable to search history:", e)
+        return []
+
+    return [Run(row) for row in rows]
+
+
+def _scan_outputs(connection, query, values, text, limit):
+    query = query.replace(
+        "SELECT %s" % _run_columns, "SELECT %s, output" % _run_columns
+    )
+    needle = text.lower()
+    rows = []
+
+    for row in connection.execute(query, values):
+        if needle in zlib.decompress(row[-1]).decode("utf-8").lower():
+            rows.append(row[:-1])
+            if len(rows) >= limit:
+                break
+
+    return rows
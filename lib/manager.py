@@ -1,3 +1,5 @@
+import threading
+
 import sublime
 
 from . import debug, settings
@@ -8,10 +10,111 @@ svid = source view id
 tv = target view
 tvid = target view id
 """
-_source_views_by_tvid = dict()
-_target_views_by_svid = dict()
-_svids_by_tvid = dict()
-_command_for_source_view = dict()
+
+
+class ViewRegistry(object):
+    """
+    Keeps the source/target view relationship and the running command for
+    every source view. All the maps are keyed by the integer view id and
+    are updated together, so forgetting either side of a pair forgets both.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._source_views_by_svid = dict()
+        self._target_views_by_svid = dict()
+        self._svids_by_tvid = dict()
+        self._commands_by_svid = dict()
+        self._last_runs_by_svid = dict()
+
+    def link(self, source_view, target_view):
+        svid = source_view.id()
+        tvid = target_view.id()
+
+        with self._lock:
+            self._forget_source(svid)
+            self._forget_target(tvid)
+
+            self._source_views_by_svid[svid] = source_view
+            self._target_views_by_svid[svid] = target_view
+            self._svids_by_tvid[tvid] = svid
+
+    def get_target_view(self, svid):
+        return self._target_views_by_svid.get(int(svid))
+
+    def get_source_view(self, tvid):
+        svid = self._svids_by_tvid.get(int(tvid))
+        return None if svid is None else self._source_views_by_svid.get(svid)
+
+    def get_source_view_id(self, tvid):
+        return self._svids_by_tvid.get(int(tvid))
+
+    def get_command(self, svid):
+        return self._commands_by_svid.get(int(svid))
+
+    def set_command(self, svid, command):
+        with self._lock:
+            self._commands_by_svid[int(svid)] = command
+
+    def clear_command(self, svid, command=None):
+        svid = int(svid)
+        with self._lock:
+            current = self._commands_by_svid.get(svid)
+            if command is None or current is command:
+                self._commands_by_svid.pop(svid, None)
+
+    def get_last_run(self, svid):
+        return self._last_runs_by_svid.get(int(svid))
+
+    def set_last_run(self, svid, last_run):
+        with self._lock:
+            self._last_runs_by_svid[int(svid)] = last_run
+
+    def forget_source(self, svid):
+        """Forgets svid as a source, returns its target view if any"""
+        with self._lock:
+            self._commands_by_svid.pop(int(svid), None)
+            self._last_runs_by_svid.pop(int(svid), None)
+            return self._forget_source(int(svid))
+
+    def forget_target(self, tvid):
+        """Forgets tvid as a target, returns the target view if any"""
+        with self._lock:
+            return self._forget_target(int(tvid))
+
+    def _forget_source(self, svid):
+        self._source_views_by_svid.pop(svid, None)
+        target_view = self._target_views_by_svid.pop(svid, None)
+
+        if target_view is not None:
+            self._svids_by_tvid.pop(target_view.id(), None)
+
+        return target_view
+
+    def _forget_target(self, tvid):
+        svid = self._svids_by_tvid.pop(tvid, None)
+
+        if svid is None:
+            return None
+
+        self._source_views_by_svid.pop(svid, None)
+        return self._target_views_by_svid.pop(svid, None)
+
+    def stats(self):
+        return dict(
+            sources=len(self._source_views_by_svid),
+            targets=len(self._target_views_by_svid),
+            reverse=len(self._svids_by_tvid),
+            commands=len(self._commands_by_svid),
+            last_runs=len(self._last_runs_by_svid),
+        )
+
+
+_registry = ViewRegistry()
+
+
+def get_registry_stats():
+    return _registry.stats()
 
 
 def cancel_command_for_view_id(view_id, wait=False):
@@ -42,199 +145,300 @@ def cancel_command_for_source_view(source_view, wait=False):
 
 
 def create_target_view_for_source_view(view, type):
-    source_id = str(view.id())
+    source_id = view.id()
+    target_view = _registry.get_target_view(source_id)
 
-    if source_id not in _target_views_by_svid:
+    if target_view is None:
         if type == "buffer":
-            new_view = _create_view_in_target_group(view)
+            target_view = _create_view_in_target_group(view)
         else:
-            vid = "ToolRunner Output (%s)" % source_id
-            new_view = view.window().create_output_panel(vid)
-            new_view.settings().set("toolrunner-output-id", vid)
-            new_view.settings().set("toolrunner-is-output", True)
+            target_view = _acquire_panel(view.window())
+
+        debug.log("Using view with id", target_view.id(), "for view", source_id)
+
+        _registry.link(view, target_view)
+
+    target_view.set_name("ToolRunner Output for %s" % view.name())
+
+    return target_view
+
+
+def _acquire_panel(win):
+    """Returns a panel of the pool of the window, or a new one"""
+    global _panel_count
+
+    free_panels = _free_panels_by_window.get(win.id(), [])
+
+    while len(free_panels) > 0:
+        panel = free_panels.pop()
+        if panel.is_valid():
+            debug.log("Reusing panel", panel.settings().get("toolrunner-output-id"))
+            return panel
+
+    _panel_count += 1
+
+    # Named by a counter, a panel outlives the source view it was made for
+    vid = "ToolRunner Output (%s)" % _panel_count
+    panel = win.create_output_panel(vid)
+    panel.settings().set("toolrunner-output-id", vid)
+    panel.settings().set("toolrunner-is-output", True)
+
+    return panel
+
+
+def _reclaim_panel(win, panel):
+    """Keeps an unused panel for the next source view, returns False if full"""
+    free_panels = _free_panels_by_window.setdefault(win.id(), [])
+
+    if len(free_panels) >= settings.get_setting("output_panel_pool_size", 4):
+        return False
+
+    panel_id = panel.settings().get("toolrunner-output-id")
 
-        target_id = str(new_view.id())
-        debug.log("Created view with id %s for view %s" % (target_id, source_id))
+    if win.active_panel() == "output." + panel_id:
+        win.run_command("hide_panel", {"panel": "output." + panel_id})
 
-        _target_views_by_svid[source_id] = new_view
-        _source_views_by_tvid[target_id] = view
-        _svids_by_tvid[target_id] = source_id
+    # Syntax and settings are kept, only the text goes
+    panel.run_command("tool_runner_clear_view")
+    free_panels.append(panel)
 
-    _target_views_by_svid[source_id].set_name("ToolRunner Output for %s" % view.name())
+    debug.log("Reclaimed panel", panel_id)
 
-    return _target_views_by_svid[source_id]
+    return True
+
+
+class _LayoutCache(object):
+    """Target groups already computed for a window layout"""
+
+    def __init__(self, signature):
+        self.signature = signature
+        self.targets = dict()
+
+
+_layout_cache_by_window = dict()
+
+# Output panels no source view uses, kept to be handed out again
+_free_panels_by_window = dict()
+_panel_count = 0
+
+
+def _layout_signature(layout):
+    return (
+        tuple(layout["cols"]),
+        tuple(layout["rows"]),
+        tuple(tuple(cell) for cell in layout["cells"]),
+    )
+
+
+def _get_cached_target_group(win, signature, group, position):
+    cache = _layout_cache_by_window.get(win.id())
+
+    if cache is None or cache.signature != signature:
+        return None
+
+    return cache.targets.get((group, position))
+
+
+def _cache_target_group(win, signature, group, position, target):
+    cache = _layout_cache_by_window.get(win.id())
+
+    if cache is None or cache.signature != signature:
+        cache = _LayoutCache(signature)
+        _layout_cache_by_window[win.id()] = cache
+
+    cache.targets[(group, position)] = target
+
+
+def forget_window(win):
+    _layout_cache_by_window.pop(win.id(), None)
+    _free_panels_by_window.pop(win.id(), None)
 
 
 def _create_view_in_target_group(view):
     win = view.window()
     group, idx = win.get_view_index(view)
 
-    target_group = settings.get_setting("output_tab_position")
-    if target_group not in set(["top", "bottom", "left", "right"]):
+    position = settings.get_setting("output_tab_position")
+    if position not in set(["top", "bottom", "left", "right"]):
         target = group
     else:
         layout = win.get_layout()
+        signature = _layout_signature(layout)
+
+        target = _get_cached_target_group(win, signature, group, position)
+
+        if target is None or target >= win.num_groups():
+            debug.log("Layout cache miss for group", group)
+            target, layout = _find_target_group(layout, group)
+
+            if layout is not None:
+                win.set_layout(layout)
+                signature = _layout_signature(layout)
+
+            _cache_target_group(win, signature, group, position, target)
 
-        x1 = 0
-        y1 = 1
-        x2 = 2
-        y2 = 3
+        win.focus_group(target)
 
-        origin_coords = layout["cells"][group]
-        debug.log(origin_coords)
-        #  min_y = 0
-        #  min_x = 0
-        max_target = None
-        min_target = None
+    target_view = win.new_file()
 
-        for idx in range(0, len(layout["cells"])):
-            if idx == group:
-                continue
-            tgroup = layout["cells"][idx]
+    group, idx = win.get_view_index(view)
 
-            if tgroup[y1] == origin_coords[y2]:
-                debug.log("Y-Matches", idx, tgroup)
-                if tgroup[x1] >= origin_coords[x1]:
-                    if max_target is None or tgroup[x1] < max_target:
-                        debug.log("X Max Matches: ", idx, tgroup)
-                        max_target = idx
-                if tgroup[x1] <= origin_coords[x1]:
-                    if min_target is None or tgroup[x1] > min_target:
-                        debug.log("X Min Matches: ", idx, tgroup)
-                        min_target = idx
+    win.focus_group(group)
+    win.focus_view(view)
 
-        debug.log("Target: %s, %s" % (max_target, min_target))
+    return target_view
 
-        target = max_target or min_target
 
-        if target is None:
-            cells = layout["cells"]
+def _find_target_group(layout, group):
+    """
+    Returns the group below the given one, and the new layout to apply if
+    the group had to be split to create it.
+    """
+    x1 = 0
+    y1 = 1
+    x2 = 2
+    y2 = 3
 
-            new_cells = list()
-            for cell in cells:
-                new_cells.append(
-                    [
-                        layout["cols"][cell[x1]],
-                        layout["rows"][cell[y1]],
-                        layout["cols"][cell[x2]],
-                        layout["rows"][cell[y2]],
-                    ]
-                )
+    origin_coords = layout["cells"][group]
+    debug.log(origin_coords)
+    max_target = None
+    min_target = None
 
-            current_cell = new_cells[group]
+    for idx in range(0, len(layout["cells"])):
+        if idx == group:
+            continue
+        tgroup = layout["cells"][idx]
 
-            debug.log(new_cells, current_cell)
+        if tgroup[y1] == origin_coords[y2]:
+            debug.log("Y-Matches", idx, tgroup)
+            if tgroup[x1] >= origin_coords[x1]:
+                if max_target is None or tgroup[x1] < max_target:
+                    debug.log("X Max Matches: ", idx, tgroup)
+                    max_target = idx
+            if tgroup[x1] <= origin_coords[x1]:
+                if min_target is None or tgroup[x1] > min_target:
+                    debug.log("X Min Matches: ", idx, tgroup)
+                    min_target = idx
 
-            new_cell = list(current_cell)
+    debug.log("Target:", max_target, min_target)
 
-            nc_height = (current_cell[y2] - current_cell[y1]) / 3
-            dic_y = current_cell[y2] - nc_height
+    target = max_target if max_target is not None else min_target
 
-            new_cell[y1] = dic_y
-            current_cell[y2] = dic_y
+    if target is not None:
+        return target, None
 
-            new_cells.append(new_cell)
+    cells = layout["cells"]
 
-            layout["rows"].append(dic_y)
-            rows = list(sorted(set(layout["rows"])))
+    new_cells = list()
+    for cell in cells:
+        new_cells.append(
+            [
+                layout["cols"][cell[x1]],
+                layout["rows"][cell[y1]],
+                layout["cols"][cell[x2]],
+                layout["rows"][cell[y2]],
+            ]
+        )
 
-            layout["rows"] = rows
+    current_cell = new_cells[group]
 
-            for cell in new_cells:
-                cell[x1] = layout["cols"].index(cell[x1])
-                cell[y1] = layout["rows"].index(cell[y1])
-                cell[x2] = layout["cols"].index(cell[x2])
-                cell[y2] = layout["rows"].index(cell[y2])
+    debug.log(new_cells, current_cell)
 
-            debug.log("New cells", new_cells)
+    new_cell = list(current_cell)
 
-            layout["cells"] = new_cells
+    nc_height = (current_cell[y2] - current_cell[y1]) / 3
+    dic_y = current_cell[y2] - nc_height
 
-            target = len(new_cells) - 1
+    new_cell[y1] = dic_y
+    current_cell[y2] = dic_y
 
-            win.set_layout(layout)
+    new_cells.append(new_cell)
 
-        if target is not None:
-            win.focus_group(target)
+    layout["rows"].append(dic_y)
+    rows = list(sorted(set(layout["rows"])))
 
-    target_view = win.new_file()
+    layout["rows"] = rows
 
-    group, idx = win.get_view_index(view)
+    for cell in new_cells:
+        cell[x1] = layout["cols"].index(cell[x1])
+        cell[y1] = layout["rows"].index(cell[y1])
+        cell[x2] = layout["cols"].index(cell[x2])
+        cell[y2] = layout["rows"].index(cell[y2])
 
-    win.focus_group(group)
-    win.focus_view(view)
+    debug.log("New cells", new_cells)
 
-    return target_view
+    layout["cells"] = new_cells
+
+    return len(new_cells) - 1, layout
 
 
 def get_source_view_id_for_target_view_id(view_id):
-    view_id = str(view_id)
-    return _svids_by_tvid.get(view_id)
+    return _registry.get_source_view_id(view_id)
 
 
 def get_source_view_for_target_view(view):
-    target_id = str(view.id())
-    return _source_views_by_tvid.get(target_id)
+    return _registry.get_source_view(view.id())
 
 
 def get_target_view_for_source_view(view):
-    source_id = str(view.id())
-    return _target_views_by_svid.get(source_id)
+    return _registry.get_target_view(view.id())
 
 
 def get_current_command_for_source_view(view):
-    view_id = str(view.id())
-    return get_current_command_for_source_view_id(view_id)
+    return get_current_command_for_source_view_id(view.id())
 
 
 def get_current_command_for_source_view_id(view_id):
-    view_id = str(view_id)
-    if view_id in _command_for_source_view:
-        return _command_for_source_view.get(view_id)
-
-    return None
+    return _registry.get_command(view_id)
 
 
 def set_current_command_for_source_view(source_view, command):
-    view_id = str(source_view.id())
-
     if command is None:
-        _command_for_source_view.pop(view_id, None)
+        _registry.clear_command(source_view.id())
     else:
-        _command_for_source_view[view_id] = command
+        _registry.set_command(source_view.id(), command)
+
+
+def clear_current_command_for_source_view(source_view, command=None):
+    _registry.clear_command(source_view.id(), command)
+
+
+def get_last_run_for_source_view(view):
+    return _registry.get_last_run(view.id())
+
+
+def set_last_run_for_source_view(view, last_run):
+    _registry.set_last_run(view.id(), last_run)
 
 
 def remove_source_view(view):
-    source_id = str(view.id())
+    source_id = view.id()
 
-    target = _target_views_by_svid.pop(source_id, None)
+    # A command still running would keep writing to a reused panel
+    running = _registry.get_command(source_id) is not None
+    target = _registry.forget_source(source_id)
 
     if target is None:
         debug.log("No target to forget")
         return
 
-    target_id = target.id()
-
-    debug.log("Forgetting as source %s => %s" % (source_id, target_id))
+    debug.log("Forgetting as source", source_id, "=>", target.id())
+    debug.log("Registry:", debug.lazy(_registry.stats))
 
-    _svids_by_tvid.pop(target_id, None)
-    _source_views_by_tvid.pop(target_id, None)
-
-    remove_panel(target)
+    remove_panel(target, reuse=not running)
 
 
 def remove_target_view(view):
-    vid = str(view.id())
-    sourceid = _svids_by_tvid.pop(vid, None)
-    _source_views_by_tvid.pop(vid, None)
+    vid = view.id()
+    tv = _registry.forget_target(vid)
 
-    debug.log("Forgetting as target %s => %s" % (sourceid, vid))
-    tv = _target_views_by_svid.pop(sourceid, None)
+    debug.log("Forgetting as target", vid, "=>", tv)
+    debug.log("Registry:", debug.lazy(_registry.stats))
 
     remove_panel(tv)
 
 
-def remove_panel(tv):
+def remove_panel(tv, reuse=True):
     if not tv:
         return
 
@@ -242,9 +446,12 @@ def remove_panel(tv):
     panel_id = tv.settings().get("toolrunner-output-id")
     win = tv.window()
 
-    debug.log("Target: %s, Is Output: %s" % (tv, is_output))
+    debug.log("Target:", tv, "Is Output:", is_output)
     if is_output:
-        debug.log("Removing panel %s" % panel_id)
+        if reuse and win is not None and _reclaim_panel(win, tv):
+            return
+
+        debug.log("Removing panel", panel_id)
 
         try:
             win.destroy_output_panel(panel_id)
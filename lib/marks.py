@@ -0,0 +1,151 @@
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+_lock = threading.Lock()
+
+_indexes_by_vid = dict()
+
+# Longest unfinished line kept for the next chunk, longer ones are scanned
+_max_partial = 64 * 1024
+
+
+class Scanner(object):
+    """
+    Finds the lines of a run's output matching the "marks" patterns of its
+    tool, as the text is appended to the output view. Text is appended in
+    chunks that may end inside a line, the unfinished line is kept and
+    scanned with the next chunk. Raises re.error when a pattern is invalid.
+    """
+
+    def __init__(self, patterns):
+        self._patterns = [
+            (kind, re.compile(pattern, re.MULTILINE))
+            for kind, pattern in sorted(patterns.items())
+        ]
+
+        self._partial = ""
+        self._partial_base = 0
+
+    def scan(self, text, base, index):
+        """Adds the lines of text matching a pattern, text starts at base"""
+        # The partial line goes on unless something else was written since
+        if self._partial != "" and self._partial_base + len(self._partial) == base:
+            text = self._partial + text
+            base = self._partial_base
+
+        end = text.rfind("\n") + 1
+
+        if len(text) - end > _max_partial:
+            end = len(text)
+
+        self._partial = text[end:]
+        self._partial_base = base + end
+
+        if end > 0:
+            self._scan_lines(text[:end], base, index)
+
+    def _scan_lines(self, text, base, index):
+        found = []
+
+        for kind, pattern in self._patterns:
+            previous = None
+
+            for match in pattern.finditer(text):
+                line_start = text.rfind("\n", 0, match.start()) + 1
+                if line_start != previous:
+                    found.append((base + line_start, kind))
+                    previous = line_start
+
+        if len(found) > 0:
+            index.add(found)
+
+
+class MarkIndex(object):
+    """Offsets of the marked lines of an output view, sorted per kind"""
+
+    def __init__(self):
+        self._offsets_by_kind = dict()
+
+    def add(self, found):
+        with _lock:
+            for offset, kind in found:
+                offsets = self._offsets_by_kind.get(kind)
+                if offsets is None:
+                    offsets = self._offsets_by_kind[kind] = array("q")
+
+                # Output is only appended, anything else is already known
+                if len(offsets) > 0 and offset <= offsets[-1]:
+                    continue
+
+                offsets.append(offset)
+
+    def truncate(self, size):
+        """Forgets the marks past size, for a view emptied since they were made"""
+        with _lock:
+            for kind, offsets in list(self._offsets_by_kind.items()):
+                end = bisect_left(offsets, size)
+                if end == 0:
+                    del self._offsets_by_kind[kind]
+                elif end < len(offsets):
+                    del offsets[end:]
+
+    def get_counts(self):
+        with _lock:
+            return [
+                (kind, len(offsets))
+                for kind, offsets in sorted(self._offsets_by_kind.items())
+            ]
+
+    def get(self, kind, position):
+        """Offset of a mark of a kind by its position, negative from the end"""
+        offsets = self._offsets_by_kind.get(kind)
+
+        if offsets is None or not -len(offsets) <= position < len(offsets):
+            return None
+
+        return offsets[position]
+
+    def get_range(self, kind, start, stop):
+        offsets = self._offsets_by_kind.get(kind)
+        return [] if offsets is None else list(offsets[start:stop])
+
+    def find(self, point, forward=True, kind=None):
+        """Offset of the closest mark after or before point"""
+        with _lock:
+            if kind is None:
+                candidates = list(self._offsets_by_kind.values())
+            else:
+                candidates = [self._offsets_by_kind.get(kind, array("q"))]
+
+        closest = None
+
+        for offsets in candidates:
+            if forward:
+                position = bisect_right(offsets, point)
+                if position < len(offsets):
+                    if closest is None or offsets[position] < closest:
+                        closest = offsets[position]
+            else:
+                position = bisect_left(offsets, point) - 1
+                if position >= 0:
+                    if closest is None or offsets[position] > closest:
+                        closest = offsets[position]
+
+        return closest
+
+
+def get_index(vid, create=False):
+    with _lock:
+        index = _indexes_by_vid.get(vid)
+
+        if index is None and create:
+            index = _indexes_by_vid[vid] = MarkIndex()
+
+        return index
+
+
+def forget(vid):
+    with _lock:
+        _indexes_by_vid.pop(vid, None)
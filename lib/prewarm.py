@@ -0,0 +1,121 @@
+import threading
+
+from . import debug, settings
+
+_lock = threading.Lock()
+_parked = dict()
+
+_max_parked = 4
+
+
+class _ParkedProcess(object):
+    def __init__(self, key, process, idle_timeout):
+        self.key = key
+        self.process = process
+        self.timer = threading.Timer(idle_timeout, evict, (key, self))
+        self.timer.daemon = True
+
+
+def is_eligible(tool, command_array):
+    """
+    Only tools that receive their input through stdin and stream their
+    output back can be started before the input is known.
+    """
+    if tool.input.mode != "pipe" or tool.output.mode != "pipe":
+        return False
+
+    return not any("$[toolrunner_" in argument for argument in command_array)
+
+
+def park(key, spawn):
+    """Starts a process with spawn() and keeps it idle until adopted"""
+    idle_timeout = settings.get_setting("prewarm_idle_timeout", 60)
+
+    with _lock:
+        parked = _parked.get(key)
+
+        if parked is not None and parked.process.poll() is None:
+            parked.timer.cancel()
+            parked = _ParkedProcess(key, parked.process, idle_timeout)
+            _parked[key] = parked
+            parked.timer.start()
+            return
+
+        if len(_parked) >= _max_parked:
+            debug.log("Too many parked processes, not prewarming", key)
+            return
+
+    process = spawn()
+
+    debug.log("Parked process", process.pid, "for", key)
+
+    parked = _ParkedProcess(key, process, idle_timeout)
+
+    with _lock:
+        previous = _parked.pop(key, None)
+        _parked[key] = parked
+
+    if previous is not None:
+        _terminate(previous)
+
+    parked.timer.start()
+
+
+def adopt(key):
+    """Takes a parked process for key, if there is a live one"""
+    with _lock:
+        parked = _parked.pop(key, None)
+
+    if parked is None:
+        return None
+
+    parked.timer.cancel()
+
+    if parked.process.poll() is not None:
+        debug.log("Parked process", parked.process.pid, "already exited")
+        return None
+
+    debug.log("Adopting parked process", parked.process.pid)
+
+    return parked.process
+
+
+def evict(key, parked=None):
+    with _lock:
+        current = _parked.get(key)
+        if current is None or (parked is not None and current is not parked):
+            return
+        del _parked[key]
+
+    debug.log("Evicting parked process", current.process.pid)
+    _terminate(current)
+
+
+def evict_all():
+    with _lock:
+        parked_list = list(_parked.values())
+        _parked.clear()
+
+    for parked in parked_list:
+        _terminate(parked)
+
+
+def _terminate(parked):
+    parked.timer.cancel()
+
+    try:
+        parked.process.terminate()
+        parked.process.wait()
+    except OSError as e:
+        debug.log("Unable to terminate parked process", e)
+
+    for stream in (parked.process.stdin, parked.process.stdout):
+        if stream is not None:
+            stream.close()
+
+
+def _on_plugin_loaded():
+    settings.register_on_change(evict_all)
+
+
+settings.register_on_plugin_loaded(_on_plugin_loaded)
@@ -0,0 +1,250 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from . import debug, workspace
+
+try:
+    import tracemalloc
+except ImportError:
+    # Not in every Python Sublime Text ships, phases are only timed then
+    tracemalloc = None
+
+_lock = threading.Lock()
+
+# Runs being profiled, tracemalloc is stopped when the last one finishes
+_active_runs = 0
+_started_tracemalloc = False
+
+_latest_report = None
+
+_max_reports = 20
+_max_stack_depth = 64
+
+
+class RunProfiler(object):
+    """
+    Profiles the phases of a single run. Each phase gets a cProfile per
+    thread it runs in, plus its wall time and the net memory traced while
+    it ran, and everything is written as a report when the run finishes.
+    """
+
+    def __init__(self, desc):
+        global _active_runs, _started_tracemalloc
+
+        self._desc = desc
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiles = dict()
+        self._durations = OrderedDict()
+        self._allocated = OrderedDict()
+        self._starttime = time.time()
+
+        with _lock:
+            _active_runs += 1
+            if tracemalloc is not None and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _started_tracemalloc = True
+
+    @contextmanager
+    def phase(self, name):
+        # A phase inside another one in the same thread is only timed, its
+        # calls are already in the outer phase's profile
+        profile = None
+        if getattr(self._local, "phase", None) is None:
+            profile = self._get_profile(name)
+
+        start = time.perf_counter()
+        memory = _get_traced_memory()
+
+        if profile is not None:
+            try:
+                profile.enable()
+                self._local.phase = name
+            except ValueError:
+                # Another profiler is active, only time this phase
+                profile = None
+
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                self._local.phase = None
+
+            duration = time.perf_counter() - start
+            allocated = _get_traced_memory() - memory
+
+            with self._lock:
+                self._durations[name] = self._durations.get(name, 0) + duration
+                self._allocated[name] = self._allocated.get(name, 0) + allocated
+
+    def wrap(self, name, function):
+        """Returns function, profiled as part of phase name"""
+
+        def profiled(*args, **kwargs):
+            with self.phase(name):
+                return function(*args, **kwargs)
+
+        return profiled
+
+    def _get_profile(self, name):
+        key = (name, threading.get_ident())
+
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is None:
+                profile = self._profiles[key] = cProfile.Profile()
+
+        return profile
+
+    def finish(self):
+        """Writes the report of the run and returns its path"""
+        global _active_runs, _started_tracemalloc, _latest_report
+
+        snapshot = None
+        if tracemalloc is not None and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+
+        with _lock:
+            _active_runs -= 1
+            if _active_runs == 0 and _started_tracemalloc:
+                tracemalloc.stop()
+                _started_tracemalloc = False
+
+        with self._lock:
+            profiles = list(self._profiles.values())
+
+        stats = None
+        for profile in profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            except TypeError:
+                # Profiles that recorded no calls can't be loaded
+                continue
+
+        try:
+            report = self._write_report(stats, snapshot)
+        except OSError as e:
+            debug.error("Unable to write profile report:", e)
+            return None
+
+        with _lock:
+            _latest_report = report
+
+        debug.info("Profile report written to", report)
+
+        return report
+
+    def _write_report(self, stats, snapshot):
+        directory = workspace.get_dir("profiles")
+        name = "%s-%s" % (
+            time.strftime("%Y%m%d-%H%M%S", time.localtime(self._starttime)),
+            re.sub(r"[^\w.-]+", "_", self._desc or "run"),
+        )
+        base = os.path.join(directory, name)
+
+        text = io.StringIO()
+        text.write("ToolRunner profile of %s\n\n" % self._desc)
+        text.write("%-16s %12s %14s\n" % ("Phase", "Seconds", "Net memory KB"))
+
+        with self._lock:
+            phases = [
+                (phase, duration, self._allocated[phase])
+                for phase, duration in self._durations.items()
+            ]
+
+        for phase, duration, allocated in phases:
+            text.write("%-16s %12.4f %14.1f\n" % (phase, duration, allocated / 1024))
+
+        if stats is not None:
+            stats.dump_stats(base + ".pstats")
+            _write_collapsed(stats, base + ".collapsed")
+
+            text.write("\nFiles: %s.pstats, %s.collapsed\n\n" % (name, name))
+            stats.stream = text
+            stats.sort_stats("cumulative").print_stats(30)
+
+        if snapshot is not None:
+            text.write("\nLargest allocations still alive at the end\n\n")
+            for statistic in snapshot.statistics("lineno")[:15]:
+                text.write("%s\n" % statistic)
+
+        with open(base + ".txt", "w", encoding="utf-8") as report_file:
+            report_file.write(text.getvalue())
+
+        _prune(directory)
+
+        return base + ".txt"
+
+
+def _get_traced_memory():
+    if tracemalloc is None:
+        return 0
+
+    return tracemalloc.get_traced_memory()[0]
+
+
+def _write_collapsed(stats, file_path):
+    """
+    Writes the profile as collapsed stacks for flame graph tools. cProfile
+    only keeps callers, so each function's own time is put under the stack
+    made of its most expensive caller at every level.
+    """
+    entries = stats.stats
+
+    with open(file_path, "w", encoding="utf-8") as collapsed:
+        for function, (_, _, own_time, _, callers) in entries.items():
+            if own_time <= 0:
+                continue
+
+            stack = [function]
+            seen = set(stack)
+
+            while callers and len(stack) < _max_stack_depth:
+                caller = max(callers, key=lambda item: callers[item][3])
+                if caller in seen or caller not in entries:
+                    break
+                stack.append(caller)
+                seen.add(caller)
+                callers = entries[caller][4]
+
+            frames = ";".join(_frame_name(frame) for frame in reversed(stack))
+            collapsed.write("%s %d\n" % (frames, own_time * 1000000))
+
+
+def _frame_name(function):
+    file_name, line, name = function
+    return "%s:%s:%s" % (os.path.basename(file_name), line, name)
+
+
+def _prune(directory):
+    reports = sorted(entry for entry in os.listdir(directory) if entry.endswith(".txt"))
+
+    for report in reports[:-_max_reports]:
+        base = os.path.join(directory, report[:-4])
+        for extension in (".txt", ".pstats", ".collapsed"):
+            try:
+                os.unlink(base + extension)
+            except OSError:
+                pass
+
+
+def get_latest_report():
+    """Path of the newest report, also from previous sessions"""
+    if _latest_report is not None and os.path.exists(_latest_report):
+        return _latest_report
+
+    directory = workspace.get_dir("profiles")
+    reports = sorted(entry for entry in os.listdir(directory) if entry.endswith(".txt"))
+
+    return os.path.join(directory, reports[-1]) if reports else None
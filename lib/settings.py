@@ -1,96 +1,193 @@
+import copy
+import json
 import re
-
-import better_settings
+from os import path
 
 from . import debug
 
-_tool_list = None
-_tool_map = None
+try:
+    import better_settings
+except ImportError:
+    # Outside Sublime Text settings come from load_files() instead
+    better_settings = None
+_snapshot = None
+
+# Keys of the package settings file, the ones every snapshot holds
+_default_keys = None
+
+_missing = object()
 
 _plugin_loaded = False
 _on_plugin_loaded_callbacks = list()
+_on_change_callbacks = list()
 _settings = None
 
 
+# Both keep string literals untouched, they are matched and put back as is
+_comments_re = re.compile(r'("(?:\\.|[^"\\])*")|//[^\n]*|/\*.*?\*/', re.DOTALL)
+_trailing_commas_re = re.compile(r'("(?:\\.|[^"\\])*")|,(?=\s*[\]}])')
+
 basepackage = re.sub(r"\.lib$", "", __package__)
 
+if better_settings is not None:
+    _scopes = (
+        better_settings.SCOPE_HOST_OS,
+        better_settings.SCOPE_HOST,
+        better_settings.SCOPE_OS,
+        better_settings.SCOPE_DEFAULT,
+    )
+else:
+    _scopes = ("host_os", "host", "os", "default")
 
-def get_setting(setting_name, default=None):
-    return _settings.get(setting_name, default)
 
+class _FileSettings(object):
+    """
+    Settings read from plain files, with the interface of better_settings.
+    Every file is part of the default scope, the first file that has a
+    setting wins, as user settings do over package settings.
+    """
 
-def set_setting(setting_name, setting_value):
-    _settings.set(better_settings.SCOPE_HOST_OS, setting_name, setting_value)
-    _settings.save()
+    def __init__(self, layers):
+        self._layers = layers
 
+    def get(self, key, default=None):
+        for layer in self._layers:
+            if key in layer:
+                return layer[key]
 
-def get_groups():
-    groups = _settings.get_scoped(better_settings.SCOPE_HOST_OS, "user_groups", [])
-    groups += _settings.get_scoped(better_settings.SCOPE_HOST, "user_groups", [])
-    groups += _settings.get_scoped(better_settings.SCOPE_OS, "user_groups", [])
-    groups += _settings.get_scoped(better_settings.SCOPE_DEFAULT, "user_groups", [])
+        return default
 
-    return groups
+    def get_scoped(self, scope, key, default=None):
+        if scope != _scopes[-1]:
+            return default
 
+        return self.get(key, default)
 
-def get_profiles(profile_group):
-    groups = get_groups()
+    def set(self, scope, key, value):
+        self._layers[0][key] = value
 
-    for group in groups:
-        if group["name"] == profile_group:
-            return group["profiles"]
+    def save(self):
+        pass
 
-    return []
+    def add_on_change(self, key, callback):
+        pass
 
+    def clear_on_change(self, key):
+        pass
 
-def get_tools():
-    _build_tool_list()
-    return _tool_list
 
+class _Snapshot(object):
+    """
+    Settings merged across scopes at one point in time. A new snapshot
+    replaces the current one on every change, so readers on any thread see
+    a consistent state without locks. Every value is copied when the
+    snapshot is made, values must be treated as read-only.
+    """
 
-def get_tool(tool_id):
-    _build_tool_list()
-    return _tool_map.get(tool_id.lower(), None)
+    def __init__(self, source):
+        self._values = dict()
 
+        for key in _get_default_keys():
+            value = source.get(key, _missing)
+            if value is not _missing:
+                self._values[key] = copy.deepcopy(value)
 
-def get_override(tool_id):
-    return _settings.get("user_tool_overrides", {}).get(tool_id)
+        self.groups = tuple(
+            copy.deepcopy(group)
+            for scope in _scopes
+            for group in source.get_scoped(scope, "user_groups", [])
+        )
+
+        self.groups_by_name = dict()
+        for group in self.groups:
+            self.groups_by_name.setdefault(group["name"], group)
 
+        self._build_tool_list(source)
 
-def _build_tool_list():
-    global _tool_map, _tool_list
+    def get(self, key, default=None):
+        return self._values.get(key, default)
 
-    _tool_map = {}
-    _tool_list = []
+    def _build_tool_list(self, source):
+        self.tools_by_name = dict()
+        tool_list = []
 
-    for settings_set in (
-        _settings.get_scoped(better_settings.SCOPE_HOST_OS, "user_tools", []),
-        _settings.get_scoped(better_settings.SCOPE_HOST, "user_tools", []),
-        _settings.get_scoped(better_settings.SCOPE_OS, "user_tools", []),
-        _settings.get_scoped(better_settings.SCOPE_DEFAULT, "user_tools", []),
-        _settings.get_scoped(better_settings.SCOPE_DEFAULT, "default_tools", []),
-    ):
-        for tool_item in settings_set:
-            key = tool_item.get("name", tool_item.get("cmd"))
+        settings_sets = [
+            source.get_scoped(scope, "user_tools", []) for scope in _scopes
+        ]
+        settings_sets.append(source.get_scoped(_scopes[-1], "default_tools", []))
 
-            if key is None:
-                debug.log("Tool has no cmd: ", tool_item)
-                continue
+        overrides = self.get("user_tool_overrides", {})
 
-            tool_item["name"] = key
+        for settings_set in settings_sets:
+            for tool_item in settings_set:
+                key = tool_item.get("name", tool_item.get("cmd"))
 
-            key = key.lower()
+                if key is None:
+                    debug.warning("Tool has no cmd:", tool_item)
+                    continue
 
-            if key not in _tool_map:
-                override_cmd = get_override(tool_item["name"])
+                if key.lower() in self.tools_by_name:
+                    continue
+
+                tool_item = copy.deepcopy(tool_item)
+                tool_item["name"] = key
+
+                override_cmd = overrides.get(key)
                 if override_cmd is not None:
                     tool_item["cmd"] = override_cmd
 
-                _tool_map[key] = tool_item
-                _tool_list.append(tool_item)
+                self.tools_by_name[key.lower()] = tool_item
+                tool_list.append(tool_item)
+
+        self.tools = tuple(tool_list)
+
 
+def _refresh():
+    global _snapshot
 
-def on_loaded():
+    _snapshot = _Snapshot(_settings)
+
+
+def get_setting(setting_name, default=None):
+    return _snapshot.get(setting_name, default)
+
+
+def set_setting(setting_name, setting_value):
+    _settings.set(_scopes[0], setting_name, setting_value)
+    _settings.save()
+    _refresh()
+
+
+def get_groups():
+    return _snapshot.groups
+
+
+def get_group(group_name):
+    return _snapshot.groups_by_name.get(group_name)
+
+
+def get_profiles(profile_group):
+    group = get_group(profile_group)
+
+    if group is not None:
+        return group["profiles"]
+
+    return []
+
+
+def get_tools():
+    return _snapshot.tools
+
+
+def get_tool(tool_id):
+    return _snapshot.tools_by_name.get(tool_id.lower(), None)
+
+
+def get_override(tool_id):
+    return _snapshot.get("user_tool_overrides", {}).get(tool_id)
+
+
+def on_loaded(loaded_settings=None):
     global _plugin_loaded
     global _settings
 
@@ -98,13 +195,18 @@ def on_loaded():
         debug.log("Plugin already loaded")
         return
 
-    _settings = better_settings.load_for(basepackage, "ToolRunner")
+    if loaded_settings is None:
+        loaded_settings = better_settings.load_for(basepackage, "ToolRunner")
+
+    _settings = loaded_settings
+    _refresh()
 
     on_debug_change()
 
     debug.log("Registering Settings Callbacks")
 
     _settings.add_on_change("debug", on_debug_change)
+    _settings.add_on_change("toolrunner", on_settings_change)
 
     if _on_plugin_loaded_callbacks is not None:
         for callback in _on_plugin_loaded_callbacks:
@@ -114,13 +216,85 @@ def on_loaded():
     del _on_plugin_loaded_callbacks[:]
 
 
+def load_files(paths):
+    """
+    Loads settings from files instead of Sublime Text, the first path has
+    the highest priority. Used by the command line entry point.
+    """
+    on_loaded(_FileSettings([_load_json(settings_path) for settings_path in paths]))
+
+
+def _get_default_keys():
+    global _default_keys
+
+    if _default_keys is None:
+        _default_keys = tuple(_parse_json(_read_default_settings()))
+
+    return _default_keys
+
+
+def _read_default_settings():
+    settings_path = path.join(
+        path.dirname(path.dirname(path.abspath(__file__))),
+        "ToolRunner.sublime-settings",
+    )
+
+    try:
+        with open(settings_path, encoding="utf-8") as settings_file:
+            return settings_file.read()
+    except OSError:
+        # Installed as a .sublime-package archive
+        import sublime
+
+        return sublime.load_resource(
+            "Packages/%s/ToolRunner.sublime-settings" % basepackage
+        )
+
+
+def _load_json(settings_path):
+    with open(settings_path, encoding="utf-8") as settings_file:
+        return _parse_json(settings_file.read())
+
+
+def _parse_json(text):
+    # Sublime Text settings allow comments and trailing commas
+    text = _comments_re.sub(_keep_strings, text)
+    text = _trailing_commas_re.sub(_keep_strings, text)
+
+    return json.loads(text)
+
+
+def _keep_strings(match):
+    return match.group(1) or ""
+
+
 def on_unloaded():
     _settings.clear_on_change("debug")
+    _settings.clear_on_change("toolrunner")
     del _on_plugin_loaded_callbacks[:]
+    del _on_change_callbacks[:]
 
 
 def on_debug_change():
     debug.enabled = _settings.get("debug")
+    debug.configure(
+        history_size=_settings.get("log_history_size", 1000),
+        file_path=_settings.get("log_file"),
+        file_level=_settings.get("log_file_level", "warning"),
+        file_max_bytes=_settings.get("log_file_max_bytes", 1024 * 1024),
+        file_backups=_settings.get("log_file_backups", 3),
+    )
+
+
+def on_settings_change():
+    _refresh()
+
+    for callback in _on_change_callbacks:
+        callback()
+
+
+def register_on_change(callback):
+    _on_change_callbacks.append(callback)
 
 
 def register_on_plugin_loaded(callback):
@@ -0,0 +1,50 @@
+import threading
+
+_lock = threading.Lock()
+
+_flights_by_key = dict()
+
+
+class Flight(object):
+    """
+    A run in progress that identical runs from other views follow instead
+    of starting their own. Its output is written to every follower too.
+    """
+
+    def __init__(self, key, leader):
+        self.key = key
+        self.leader = leader
+        self.followers = []
+        self.finished = False
+
+        # Held while output is written, so a follower joining in between
+        # neither misses nor repeats any of it
+        self.lock = threading.RLock()
+
+
+def join(key, execution):
+    """
+    Returns the flight already running for key, or a new one that
+    execution leads
+    """
+    with _lock:
+        flight = _flights_by_key.get(key)
+
+        if flight is None:
+            flight = _flights_by_key[key] = Flight(key, execution)
+
+        return flight
+
+
+def finish(flight):
+    """Ends the flight, returns the followers it had"""
+    with _lock:
+        if _flights_by_key.get(flight.key) is flight:
+            del _flights_by_key[flight.key]
+
+    with flight.lock:
+        flight.finished = True
+        followers = flight.followers
+        flight.followers = []
+
+    return followers
@@ -41,15 +41,29 @@ class ConfigContainer(object):
                 else:
                     setattr(self, k, attr_value)
 
+    def as_key(self):
+        """The values of the config, in an order that does not change"""
+        return tuple((name, getattr(self, name)) for name in sorted(self._props))
+
     def __repr__(self):
         return self.__class__.__name__ + ":" + self.__dict__.__repr__()
 
 
 class Tool(ConfigContainer):
     command_arguments = dict(
-        input_source="input_source", results="results", params="params_values"
+        input_source="input_source",
+        results="results",
+        params="params_values",
+        limits="limits",
+        batches="batches",
+        preview="preview",
+        filters="filters",
     )
 
+    # Command arguments the arguments of the run set over the group and the
+    # profile, the others are taken from the first of them that has them
+    run_overrides = set(["preview"])
+
     def _get_defaults(self):
         return dict(
             name="",
@@ -59,6 +73,11 @@ class Tool(ConfigContainer):
             input=Input(),
             output=Output(),
             results=Results(),
+            limits=Limits(),
+            batches=Batches(),
+            preview=Preview(),
+            filters=Filters(),
+            marks=dict(),  # kind of mark to pattern of the lines to index
             params=dict(),
             input_source=None,
             params_values=dict(),
@@ -66,7 +85,8 @@ class Tool(ConfigContainer):
 
     def set_command_arguments(self, *args):
         def get_value(argName):
-            for conf in args:
+            confs = reversed(args) if argName in Tool.run_overrides else args
+            for conf in confs:
                 if argName in conf:
                     return conf[argName]
             return None
@@ -77,6 +97,12 @@ class Tool(ConfigContainer):
 
         self.update(conf)
 
+    def get_executable(self):
+        if isinstance(self.cmd, list):
+            return self.cmd[0] if len(self.cmd) > 0 else None
+
+        return self.cmd
+
     def get_command_array(self, input_text=None):
         if type(self.cmd) == list:
             full_arguments = self.cmd.copy()
@@ -146,10 +172,63 @@ class Results(ConfigContainer):
             read_only=False,
             scratch=True,
             line_numbers=False,
+            diff=False,
             syntax_file=settings.get_setting("default_syntax_file"),
         )
 
 
+class Limits(ConfigContainer):
+    def _get_defaults(self):
+        return dict(
+            timeout=None,  # seconds
+            max_output_bytes=None,
+            max_output_lines=None,
+            max_memory_mb=None,  # POSIX only
+            max_cpu_seconds=None,  # POSIX only
+        )
+
+    def has_resource_limits(self):
+        return self.max_memory_mb is not None or self.max_cpu_seconds is not None
+
+
+class Batches(ConfigContainer):
+    def _get_defaults(self):
+        return dict(
+            separator=None,  # "GO" for sqlcmd, "/" for SQLcl
+            stop_on_error=True,
+        )
+
+
+class Preview(ConfigContainer):
+    def _get_defaults(self):
+        return dict(
+            lines=None,
+            bytes=None,
+            rows=None,  # lines with text other than table borders
+        )
+
+    def is_enabled(self):
+        return self.lines is not None or self.bytes is not None or self.rows is not None
+
+
+class Filters(ConfigContainer):
+    def _get_defaults(self):
+        return dict(
+            include=None,  # pattern or list of patterns
+            exclude=None,
+            dedupe=False,  # consecutive identical lines
+            tail=None,  # lines kept from the end
+        )
+
+    def is_enabled(self):
+        return (
+            self.include is not None
+            or self.exclude is not None
+            or self.dedupe
+            or self.tail is not None
+        )
+
+
 def _on_plugin_loaded():
     debug.log("Setting defaults for tools")
     _set_default_codecs()
@@ -5,17 +5,65 @@ import sublime
 
 from . import debug, settings
 
+_max_expansion_contexts = 64
+_expansion_contexts = dict()
+
+
+class _ExpansionContext(object):
+    """Variables and already expanded values for a window and file"""
+
+    def __init__(self, variables):
+        self.variables = variables
+        self.expanded = dict()
+
+    def expand(self, value):
+        if not isinstance(value, str):
+            return expand_variables(value, self.variables)
+
+        expanded = self.expanded.get(value)
+
+        if expanded is None:
+            expanded = expand_variables(value, self.variables)
+            self.expanded[value] = expanded
+
+        return expanded
+
 
 def expand(value, view):
     if value is None:
         return None
 
-    variables = {}
-    variables.update(extract_variables(view))
-    variables.update({"package": settings.basepackage})
-    expanded = expand_variables(value, variables)
+    return _get_expansion_context(view).expand(value)
+
+
+def _get_expansion_context(view):
+    win = view.window()
+    key = (win.id() if win is not None else None, view.file_name())
+
+    context = _expansion_contexts.get(key)
+
+    if context is None:
+        variables = {}
+        variables.update(extract_variables(view))
+        variables.update({"package": settings.basepackage})
+
+        if len(_expansion_contexts) >= _max_expansion_contexts:
+            _expansion_contexts.clear()
+
+        context = _ExpansionContext(variables)
+        _expansion_contexts[key] = context
 
-    return expanded
+    return context
+
+
+def invalidate_expansions(window=None):
+    """Forgets the cached variables for window, or for every window"""
+    if window is None:
+        _expansion_contexts.clear()
+        return
+
+    for key in [key for key in _expansion_contexts if key[0] == window.id()]:
+        _expansion_contexts.pop(key, None)
 
 
 def expand_variables(str, vars):
@@ -38,15 +86,13 @@ def expand_variables(str, vars):
 
 def extract_variables(view):
     win = view.window()
+    filename = view.file_name()
+    folder, basename = path.split(filename) if filename is not None else (None, None)
+    base, ext = path.splitext(basename) if filename is not None else (None, None)
+
     try:
-        return win.extract_variables()
+        variables = win.extract_variables()
     except AttributeError:
-        filename = view.file_name()
-        folder, basename = (
-            path.split(filename) if filename is not None else (None, None)
-        )
-        base, ext = path.splitext(basename) if filename is not None else (None, None)
-
         project = win.project_file_name()
         pfolder, pbasename = (
             path.split(project) if project is not None else (None, None)
@@ -73,15 +119,36 @@ def extract_variables(view):
             "project_extension": baseext,
         }
 
+    # The file variables of the window are those of its active view, which
+    # is not always view
+    for key in ("file", "file_path", "file_name", "file_base_name", "file_extension"):
+        variables.pop(key, None)
+
+    if filename is not None:
+        variables.update(
+            {
+                "file": filename,
+                "file_path": folder,
+                "file_name": basename,
+                "file_base_name": base,
+                "file_extension": ext[1:],
+            }
+        )
+
+    return variables
+
 
 def notify(msg, desc=None, source=None, target=None):
+    debug.log(msg)
+    set_status(msg, desc, source, target)
+
+
+def set_status(msg, desc=None, source=None, target=None):
     if desc is None:
         desc = "ToolRunner"
     else:
         desc = "ToolRunner[%s]" % desc
 
-    debug.log(msg)
-
     if source is None:
         source = sublime.active_window().active_view()
 
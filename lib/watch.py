@@ -0,0 +1,116 @@
+import threading
+
+import sublime
+
+from . import debug, manager, settings, util
+from .command import Command
+
+_lock = threading.Lock()
+_generations_by_svid = dict()
+
+
+def is_watching(view):
+    return view.id() in _generations_by_svid
+
+
+def toggle(view):
+    if is_watching(view):
+        forget(view)
+        util.notify("Watch disabled", source=view)
+        return False
+
+    if manager.get_last_run_for_source_view(view) is None:
+        util.notify("Run a tool on this view before watching it", source=view)
+        return False
+
+    with _lock:
+        _generations_by_svid[view.id()] = 0
+
+    view.set_status("toolrunner-watch", "ToolRunner: Watching")
+    util.notify("Watch enabled", source=view)
+    return True
+
+
+def forget(view):
+    with _lock:
+        _generations_by_svid.pop(view.id(), None)
+
+    view.erase_status("toolrunner-watch")
+
+
+def on_saved(view):
+    """
+    Schedules a re-run of the last run for view. Saves within the debounce
+    delay of each other collapse into a single run.
+    """
+    svid = view.id()
+
+    with _lock:
+        if svid not in _generations_by_svid:
+            return
+
+        _generations_by_svid[svid] += 1
+        generation = _generations_by_svid[svid]
+
+    last_run = manager.get_last_run_for_source_view(view)
+
+    if last_run is None:
+        return
+
+    if _is_prewarmed(last_run):
+        sublime.set_timeout_async(lambda: _prewarm(view, last_run), 0)
+
+    sublime.set_timeout(
+        lambda: _on_debounced(view, generation),
+        settings.get_setting("watch_debounce_ms", 500),
+    )
+
+
+def rerun(view, last_run, **overrides):
+    """Runs again the tool or profile described by last_run on view"""
+    command_arguments = dict(last_run["args"])
+    command_arguments.update(overrides)
+
+    command = Command(view.window(), command_arguments, source_view=view)
+
+    if "tool" in last_run:
+        command.run_tool(last_run["tool"])
+    else:
+        command.run_profile(last_run["group"], last_run["profile"])
+
+    return command
+
+
+def _on_debounced(view, generation):
+    with _lock:
+        if _generations_by_svid.get(view.id()) != generation:
+            debug.log("Watch run superseded for view", view.id())
+            return
+
+    last_run = manager.get_last_run_for_source_view(view)
+
+    if last_run is None or view.window() is None:
+        return
+
+    debug.log("Watch run for view", view.id(), last_run)
+    rerun(view, last_run)
+
+
+def _is_prewarmed(last_run):
+    """Only runs of the groups in "prewarm_groups" are prewarmed on save"""
+    if "group" not in last_run:
+        return False
+
+    return last_run["group"] in settings.get_setting("prewarm_groups", {}).values()
+
+
+def _prewarm(view, last_run):
+    if view.window() is None:
+        return
+
+    command = Command(view.window(), dict(last_run["args"]), source_view=view)
+
+    if "tool" in last_run:
+        command.prewarm_tool(last_run["tool"])
+    else:
+        command.prewarm_profile(last_run["group"], last_run["profile"])
@@ -0,0 +1,239 @@
+import atexit
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+
+from . import debug, settings
+
+_lock = threading.Lock()
+
+_session_dir = None
+_free_slots = dict()
+_slot_keys = dict()
+
+# Released slots kept for reuse, per kind and suffix
+_max_free_slots = 4
+
+# tmpfs is only used when it has this much room, it lives in memory
+_min_tmpfs_free = 512 * 1024 * 1024
+
+# Where liveness can't be checked, sessions idle for longer are stale
+_stale_age = 24 * 3600
+
+_session_prefix = "session-"
+
+
+def _get_root():
+    root = settings.get_setting("workspace_dir")
+
+    if root is None:
+        root = tempfile.gettempdir()
+
+        if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+            try:
+                if shutil.disk_usage("/dev/shm").free >= _min_tmpfs_free:
+                    root = "/dev/shm"
+            except OSError:
+                pass
+
+    if hasattr(os, "getuid"):
+        return os.path.join(root, "toolrunner-%s" % os.getuid())
+
+    return os.path.join(root, "toolrunner")
+
+
+def get_session_dir():
+    """Directory for the temp files of this process, created on first use"""
+    global _session_dir
+
+    with _lock:
+        if _session_dir is None:
+            root = _get_root()
+            session_dir = os.path.join(root, "%s%s" % (_session_prefix, os.getpid()))
+
+            if not (_make_private_dir(root) and _make_private_dir(session_dir)):
+                debug.warning("Workspace is not private, not using it:", session_dir)
+                session_dir = tempfile.mkdtemp(prefix="toolrunner-")
+
+            atexit.register(shutil.rmtree, session_dir, True)
+            _session_dir = session_dir
+            debug.log("Using workspace:", session_dir)
+
+        return _session_dir
+
+
+def get_dir(name):
+    """Directory shared by every session, for files kept after they end"""
+    root = _get_root()
+    directory = os.path.join(root, name)
+
+    if _make_private_dir(root) and _make_private_dir(directory):
+        return directory
+
+    # Kept for this session only
+    directory = os.path.join(get_session_dir(), name)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    return directory
+
+
+def _make_private_dir(directory):
+    """
+    Creates directory for this user alone. Returns False when it is not a
+    directory only this user can use, as the root is in a shared place
+    where someone else may have made it first.
+    """
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    else:
+        # mkdir() applies the umask
+        os.chmod(directory, 0o700)
+
+    return _is_private(directory)
+
+
+def _is_private(directory):
+    try:
+        status = os.lstat(directory)
+    except OSError:
+        return False
+
+    if not stat.S_ISDIR(status.st_mode):
+        return False
+
+    if not hasattr(os, "getuid"):
+        return True
+
+    return status.st_uid == os.getuid() and stat.S_IMODE(status.st_mode) == 0o700
+
+
+def acquire(kind, suffix=""):
+    """Returns the path of an empty file to use until release()"""
+    session_dir = get_session_dir()
+
+    with _lock:
+        free = _free_slots.get((kind, suffix))
+        if free:
+            return free.pop()
+
+    handle, slot = tempfile.mkstemp(prefix="%s-" % kind, suffix=suffix, dir=session_dir)
+    os.close(handle)
+
+    with _lock:
+        _slot_keys[slot] = (kind, suffix)
+
+    return slot
+
+
+def release(slot):
+    """Empties the file and keeps it for reuse, or removes it"""
+    with _lock:
+        key = _slot_keys.get(slot)
+        free = _free_slots.setdefault(key, [])
+        reuse = (
+            key is not None
+            and os.path.dirname(slot) == _session_dir
+            and len(free) < _max_free_slots
+        )
+
+        if not reuse:
+            _slot_keys.pop(slot, None)
+
+    try:
+        if reuse:
+            os.truncate(slot, 0)
+        else:
+            os.unlink(slot)
+    except OSError as e:
+        debug.log("Unable to release", slot, e)
+        return
+
+    if reuse:
+        with _lock:
+            free.append(slot)
+
+
+def sweep():
+    """Removes what sessions of processes no longer running left behind"""
+    root = _get_root()
+
+    if not _is_private(root):
+        return
+
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return
+
+    for name in names:
+        if not name.startswith(_session_prefix):
+            continue
+
+        try:
+            pid = int(name.partition("-")[2])
+        except ValueError:
+            continue
+
+        session_dir = os.path.join(root, name)
+
+        if pid == os.getpid() or _is_alive(pid, session_dir):
+            continue
+
+        debug.log("Removing stale workspace:", session_dir)
+        shutil.rmtree(session_dir, ignore_errors=True)
+
+
+def _is_alive(pid, session_dir):
+    if os.name == "posix":
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
+
+    # os.kill() would terminate the process on Windows
+    try:
+        return time.time() - os.path.getmtime(session_dir) < _stale_age
+    except OSError:
+        return False
+
+
+def _forget_session():
+    global _session_dir
+
+    with _lock:
+        free_slots = [slot for free in _free_slots.values() for slot in free]
+        _session_dir = None
+        _free_slots.clear()
+        _slot_keys.clear()
+
+    for slot in free_slots:
+        try:
+            os.unlink(slot)
+        except OSError:
+            pass
+
+
+def _on_settings_change():
+    root = _get_root()
+
+    # Slots in use are removed when released, the pool starts over
+    if _session_dir is not None and os.path.dirname(_session_dir) != root:
+        _forget_session()
+
+
+def _on_plugin_loaded():
+    sweep()
+    settings.register_on_change(_on_settings_change)
+
+
+settings.register_on_plugin_loaded(_on_plugin_loaded)
@@ -0,0 +1,105 @@
+import threading
+from collections import deque
+from threading import Thread
+
+
+class BatchWriter(object):
+    """
+    Collects text produced by a reader thread and hands it to write() in
+    batches, at most every max_delay seconds or once max_size characters
+    are pending, so the view receives a few large appends instead of one
+    per line. Batches are never larger than max_size, and put() waits once
+    max_pending characters are pending, so a fast reader can't queue more
+    than the view takes.
+    """
+
+    def __init__(
+        self, write, max_delay=0.05, max_size=64 * 1024, max_pending=1024 * 1024
+    ):
+        self._write = write
+        self._max_delay = max_delay
+        self._max_size = max_size
+        self._max_pending = max_pending
+
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._pending = deque()
+        self._pending_size = 0
+
+        self._wake = threading.Event()
+        self._closed = False
+
+        self._thread = Thread(target=self._flush_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, text):
+        with self._lock:
+            # The flushing thread is checked in case a write raised
+            while (
+                self._pending_size >= self._max_pending
+                and not self._closed
+                and self._thread.is_alive()
+            ):
+                self._wake.set()
+                self._drained.wait(self._max_delay)
+
+            self._pending.append(text)
+            self._pending_size += len(text)
+            full = self._pending_size >= self._max_size
+
+        if full:
+            self._wake.set()
+
+    def depth(self):
+        """Chunks waiting to be written"""
+        return len(self._pending)
+
+    def flush(self):
+        while True:
+            with self._lock:
+                text = self._take()
+
+            if text == "":
+                return
+
+            self._write(text)
+
+    def close(self):
+        """Writes everything pending and stops the flushing thread"""
+        with self._lock:
+            self._closed = True
+            self._drained.notify_all()
+
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+
+    def _take(self):
+        """Removes up to max_size pending characters, with the lock held"""
+        taken = []
+        size = 0
+
+        while len(self._pending) > 0 and size < self._max_size:
+            text = self._pending.popleft()
+
+            if size + len(text) > self._max_size:
+                cut = self._max_size - size
+                self._pending.appendleft(text[cut:])
+                text = text[:cut]
+
+            taken.append(text)
+            size += len(text)
+
+        self._pending_size -= size
+
+        if size > 0:
+            self._drained.notify_all()
+
+        return "".join(taken)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self._max_delay)
+            self._wake.clear()
+            self.flush()
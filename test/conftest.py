@@ -0,0 +1,10 @@
+import sys
+import types
+from os import path
+
+# lib is imported as a package from the repository root, as lib.cli does
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+# Outside Sublime Text only the names used at import time are needed
+if "sublime" not in sys.modules:
+    sys.modules["sublime"] = types.ModuleType("sublime")
@@ -0,0 +1,23 @@
+from lib import debug
+
+
+def test_history_keeps_arguments_as_they_were_logged(monkeypatch):
+    monkeypatch.setattr(debug, "enabled", False)
+    monkeypatch.setattr(debug, "_history", debug.deque(maxlen=10))
+
+    command_array = ["sh", "-c"]
+    debug.log("Using Command Line:", command_array)
+    command_array.append("changed")
+
+    assert debug.history()[-1].endswith("Using Command Line: ['sh', '-c']")
+
+
+def test_lazy_arguments_are_evaluated_when_logged(monkeypatch):
+    monkeypatch.setattr(debug, "enabled", False)
+    monkeypatch.setattr(debug, "_history", debug.deque(maxlen=10))
+
+    stats = dict(sources=1)
+    debug.log("Registry:", debug.lazy(lambda: dict(stats)))
+    stats["sources"] = 0
+
+    assert debug.history()[-1].endswith("Registry: {'sources': 1}")
@@ -0,0 +1,46 @@
+from lib import diff
+
+
+def _run(key, text, chunk_size=7):
+    differ = diff.OutputDiffer(key)
+
+    for start in range(0, len(text), chunk_size):
+        end = start + chunk_size
+        differ.feed(text[start:end])
+
+    return "".join(differ.finish())
+
+
+def test_first_run_is_only_stored():
+    key = diff.run_key("first", 1)
+
+    assert _run(key, "a\nb\n") == ""
+    assert _run(key, "a\nb\n") == ":: No changes since previous run ::\n"
+
+
+def test_changed_lines_are_shown_as_hunks():
+    key = diff.run_key("changed", 1)
+    _run(key, "a\nb\nc\n")
+
+    assert _run(key, "a\nB\nc\nd") == (
+        ":: Changes since previous run: +2 -1 lines ::\n"
+        "@@ -2,1 +2,1 @@\n-b\n+B\n"
+        "@@ -4,0 +4,1 @@\n+d\n"
+    )
+
+
+def test_stopped_runs_are_not_stored():
+    key = diff.run_key("stopped", 1)
+    _run(key, "a\nb\n")
+
+    differ = diff.OutputDiffer(key)
+    differ.feed("a\n")
+    assert "".join(differ.abandon()) == (
+        ":: Output not compared, the run was stopped ::\na\n"
+    )
+
+    assert _run(key, "a\nb\n") == ":: No changes since previous run ::\n"
+
+
+def test_keys_differ_by_every_part():
+    assert diff.run_key("tool", ["a"], None) != diff.run_key("tool", ["a"], "")
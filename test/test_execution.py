@@ -0,0 +1,65 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+from lib.execution import _get_peak_rss, _split_batches
+
+
+def test_batches_end_after_separator_lines():
+    text = "select 1\nGO\n\nselect 2\n  go  \nGO\nselect 3"
+
+    assert _split_batches(text, "GO") == [
+        (1, "select 1\nGO\n"),
+        (4, "\nselect 2\n  go  \n"),
+        (7, "select 3\n"),
+    ]
+
+
+def test_separator_must_be_alone_on_its_line():
+    text = "select 1\ngo 2\nselect goal\n"
+
+    assert _split_batches(text, "GO") == [(1, text)]
+
+
+def test_batches_with_only_separators_are_skipped():
+    assert _split_batches("GO\n\nGO\n", "GO") == []
+
+
+def test_separator_is_matched_literally():
+    assert _split_batches("begin\n/\nend;\n/\n", "/") == [
+        (1, "begin\n/\n"),
+        (3, "end;\n/\n"),
+    ]
+
+
+def test_separator_lines_may_end_with_crlf():
+    assert _split_batches("a\r\nGO\r\nb\r\n", "GO") == [
+        (1, "a\r\nGO\r\n"),
+        (3, "b\r\n"),
+    ]
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/task"), reason="needs /proc")
+def test_peak_rss_covers_the_processes_a_tool_starts():
+    child = "x = bytearray(64 * 1024 * 1024); import time; time.sleep(5)"
+    script = "import subprocess, sys; subprocess.call([sys.executable, '-c', %r])"
+    process = subprocess.Popen(
+        [sys.executable, "-c", script % child], start_new_session=True
+    )
+    deadline = time.time() + 5
+    peak = None
+
+    try:
+        while time.time() < deadline and (peak or 0) < 64 * 1024 * 1024:
+            time.sleep(0.05)
+            peak = _get_peak_rss(process.pid)
+    finally:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+    assert peak >= 64 * 1024 * 1024
+    assert _get_peak_rss(process.pid) is None
@@ -0,0 +1,33 @@
+from lib.filters import OutputFilter
+from lib.tool import Filters
+
+
+def _apply(lines, **config):
+    output_filter = OutputFilter(Filters(**config))
+    shown = [output_filter.feed(line) for line in lines]
+
+    return [line for line in shown if line is not None], output_filter
+
+
+def test_include_and_exclude_patterns():
+    lines = ["error: a\n", "warning: b\n", "error: skip c\n"]
+
+    shown, output_filter = _apply(lines, include=["error", "warning"], exclude="skip")
+
+    assert shown == ["error: a\n", "warning: b\n"]
+    assert output_filter.discarded == 1
+
+
+def test_dedupe_collapses_consecutive_lines_only():
+    shown, _ = _apply(["a\n", "a\n", "b\n", "a\n"], dedupe=True)
+
+    assert shown == ["a\n", "b\n", "a\n"]
+
+
+def test_tail_keeps_the_last_lines_until_flushed():
+    shown, output_filter = _apply(["1\n", "2\n", "3\n", "4\n"], tail=2)
+
+    assert shown == []
+    assert output_filter.flush() == "3\n4\n"
+    assert output_filter.flush() == ""
+    assert output_filter.discarded == 2
@@ -0,0 +1,97 @@
+import itertools
+
+from lib import manager
+
+_ids = itertools.count(1)
+
+
+class _Settings(dict):
+    def set(self, key, value):
+        self[key] = value
+
+
+class _View(object):
+    def __init__(self, window):
+        self._id = next(_ids)
+        self._settings = _Settings()
+        self._window = window
+
+    def id(self):
+        return self._id
+
+    def name(self):
+        return "view"
+
+    def set_name(self, name):
+        pass
+
+    def settings(self):
+        return self._settings
+
+    def window(self):
+        return self._window
+
+    def is_valid(self):
+        return True
+
+    def run_command(self, command, args=None):
+        pass
+
+
+class _Window(object):
+    def id(self):
+        return 1
+
+    def active_panel(self):
+        return None
+
+    def create_output_panel(self, name):
+        return _View(self)
+
+    def destroy_output_panel(self, name):
+        pass
+
+
+def _cycle(registry, window):
+    source = _View(window)
+    target = _View(window)
+
+    registry.link(source, target)
+    registry.set_command(source.id(), object())
+    registry.set_last_run(source.id(), dict(tool="tool"))
+    registry.clear_command(source.id())
+
+    if source.id() % 2:
+        registry.forget_source(source.id())
+    else:
+        registry.forget_target(target.id())
+        registry.forget_source(source.id())
+
+
+def test_registry_is_empty_after_link_and_forget_cycles():
+    registry = manager.ViewRegistry()
+    window = _Window()
+
+    for _ in range(5000):
+        _cycle(registry, window)
+
+    assert registry.stats() == dict(
+        sources=0, targets=0, reverse=0, commands=0, last_runs=0
+    )
+
+
+def test_relinking_a_source_forgets_its_previous_target():
+    registry = manager.ViewRegistry()
+    window = _Window()
+    source = _View(window)
+
+    for _ in range(1000):
+        registry.link(source, _View(window))
+
+    assert registry.stats()["reverse"] == 1
+
+    registry.forget_source(source.id())
+
+    assert registry.stats() == dict(
+        sources=0, targets=0, reverse=0, commands=0, last_runs=0
+    )
@@ -0,0 +1,48 @@
+from lib import marks
+
+
+def _scan(chunks, patterns):
+    scanner = marks.Scanner(patterns)
+    index = marks.MarkIndex()
+    base = 0
+
+    for chunk in chunks:
+        scanner.scan(chunk, base, index)
+        base += len(chunk)
+
+    return index
+
+
+def test_lines_split_across_chunks_are_found():
+    text = "Msg 1 first\nok\nMsg 2 second\nok\n"
+    expected = [0, text.index("Msg 2")]
+
+    for size in range(1, len(text)):
+        chunks = [text[start:][:size] for start in range(0, len(text), size)]
+        index = _scan(chunks, dict(error="^Msg"))
+
+        assert index.get_range("error", 0, None) == expected, size
+
+
+def test_chunks_starting_inside_a_line_are_not_line_starts():
+    index = _scan(["ok Ms", "g 1\n"], dict(error="^Msg"))
+
+    assert index.get_counts() == []
+
+
+def test_partial_line_is_dropped_when_the_view_changed():
+    scanner = marks.Scanner(dict(error="^Msg"))
+    index = marks.MarkIndex()
+
+    scanner.scan("Msg 1 unfinished", 0, index)
+    scanner.scan("Msg 2\n", 100, index)
+
+    assert index.get_range("error", 0, None) == [100]
+
+
+def test_every_kind_is_indexed_once_per_line():
+    index = _scan(["error Msg\nwarning\n"], dict(error="error|Msg", warning="^warn"))
+
+    assert index.get_counts() == [("error", 1), ("warning", 1)]
+    assert index.find(0) == 10
+    assert index.find(10, forward=False) == 0
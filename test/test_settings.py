@@ -0,0 +1,41 @@
+from lib import settings
+
+
+def test_comments_and_trailing_commas_are_removed():
+    text = """{
+        // a comment with "quotes"
+        "a": 1, /* a block
+        comment */ "b": [1, 2,],
+    }"""
+
+    assert settings._parse_json(text) == {"a": 1, "b": [1, 2]}
+
+
+def test_strings_are_kept_as_they_are():
+    text = r"""{
+        "url": "http://host//path",
+        "block": "/* kept */",
+        "escaped": "say \" // still a string",
+        "comma": ",]",
+    }"""
+
+    assert settings._parse_json(text) == {
+        "url": "http://host//path",
+        "block": "/* kept */",
+        "escaped": 'say " // still a string',
+        "comma": ",]",
+    }
+
+
+def test_package_settings_are_parsed():
+    keys = settings._get_default_keys()
+
+    assert "default_tools" in keys and "single_flight" in keys
+
+
+def test_file_settings_prefer_the_first_file():
+    file_settings = settings._FileSettings([{"a": 1}, {"a": 2, "b": 3}])
+
+    assert file_settings.get("a") == 1
+    assert file_settings.get("b") == 3
+    assert file_settings.get_scoped("host", "b") is None
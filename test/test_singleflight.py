@@ -0,0 +1,25 @@
+from lib import singleflight
+
+
+def test_identical_runs_join_the_first_one():
+    leader, follower = object(), object()
+
+    flight = singleflight.join("key", leader)
+    assert singleflight.join("key", follower) is flight
+    assert flight.leader is leader
+
+    flight.followers.append(follower)
+
+    assert singleflight.finish(flight) == [follower]
+    assert flight.finished and flight.followers == []
+
+
+def test_a_finished_flight_is_not_joined():
+    first = singleflight.join("finished", object())
+    singleflight.finish(first)
+
+    second = singleflight.join("finished", object())
+
+    assert second is not first
+    singleflight.finish(second)
+    assert singleflight._flights_by_key == {}
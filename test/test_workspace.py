@@ -0,0 +1,44 @@
+import os
+
+from lib import workspace
+
+
+def _use_root(monkeypatch, root):
+    monkeypatch.setattr(workspace.tempfile, "tempdir", os.path.dirname(root))
+    monkeypatch.setattr(workspace, "_get_root", lambda: root)
+    monkeypatch.setattr(workspace, "_session_dir", None)
+    monkeypatch.setattr(workspace.atexit, "register", lambda *args: None)
+
+
+def test_session_dir_is_private(tmp_path, monkeypatch):
+    root = str(tmp_path / "toolrunner")
+    _use_root(monkeypatch, root)
+
+    session_dir = workspace.get_session_dir()
+
+    assert os.path.dirname(session_dir) == root
+    assert os.stat(root).st_mode & 0o777 == 0o700
+    assert os.stat(session_dir).st_mode & 0o777 == 0o700
+
+
+def test_root_others_can_write_is_not_used(tmp_path, monkeypatch):
+    root = str(tmp_path / "toolrunner")
+    os.mkdir(root)
+    os.chmod(root, 0o777)
+    _use_root(monkeypatch, root)
+
+    session_dir = workspace.get_session_dir()
+
+    assert not session_dir.startswith(root + os.sep)
+    assert workspace._is_private(session_dir)
+
+
+def test_symlinked_root_is_not_used(tmp_path, monkeypatch):
+    target = str(tmp_path / "elsewhere")
+    os.mkdir(target, 0o700)
+    root = str(tmp_path / "toolrunner")
+    os.symlink(target, root)
+    _use_root(monkeypatch, root)
+
+    assert not workspace.get_dir("profiles").startswith(root + os.sep)
+    assert os.listdir(target) == []
@@ -0,0 +1,49 @@
+import threading
+import time
+
+import pytest
+
+from lib.writer import BatchWriter
+
+
+def test_writes_are_sliced_and_puts_wait_for_the_view():
+    writes = []
+    pending = []
+
+    def write(text):
+        # A view slower than the reader
+        time.sleep(0.001)
+        writes.append(text)
+        pending.append(writer._pending_size)
+
+    writer = BatchWriter(write, max_size=64 * 1024, max_pending=256 * 1024)
+    chunk = "x" * (255 * 1024) + "\n"
+
+    for _ in range(40):
+        writer.put(chunk)
+
+    writer.close()
+
+    assert "".join(writes) == chunk * 40
+    assert max(len(text) for text in writes) <= 64 * 1024
+    assert max(pending) <= 256 * 1024 + len(chunk)
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_put_does_not_wait_after_the_writer_failed():
+    def write(text):
+        raise ValueError("view closed")
+
+    writer = BatchWriter(write, max_size=10, max_pending=20)
+    done = threading.Event()
+
+    def reader():
+        for _ in range(100):
+            writer.put("0123456789")
+        done.set()
+
+    thread = threading.Thread(target=reader)
+    thread.daemon = True
+    thread.start()
+
+    assert done.wait(5)